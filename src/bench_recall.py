@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+from searchengine import SearchEngine
+from searchengine import load_dictionary
+from searchengine import load_documents
+from searchengine import load_impacts
+from searchengine import load_metadata
+from searchengine import load_stem_cache
+from searchengine import load_synonym_table
+from searchengine import metadata_file_name
+
+import getopt
+import sys
+import time
+
+usage = f'usage: {sys.argv[0]} (-x index-directory | -d dictionary-file -p postings-file) -q file-of-queries [-k number-of-results] [-B postings-budgets] [-T time-budgets-milliseconds]'
+
+def rank(vector_space_model, query_vectors, k, postings_budget=None, time_budget=None):
+    '''
+    ranks the top k documents of the query vectors with the given budgets, without budgets they are ranked exhaustively.
+    returns the rankings and the mean number of milliseconds taken per query vector.
+    '''
+    vector_space_model.postings_budget = postings_budget
+    vector_space_model.time_budget = time_budget
+    rankings = []
+    start = time.perf_counter()
+    for query_vector in query_vectors:
+        rankings.append(vector_space_model._rank(query_vector, [], k))
+    return rankings, 1000 * (time.perf_counter() - start) / len(query_vectors)
+
+def recall(rankings, exhaustive_rankings):
+    '''
+    gets the mean recall of the rankings against the rankings of exhaustive ranking.
+    '''
+    recalls = [len(set(r) & set(e)) / len(e) for r, e in zip(rankings, exhaustive_rankings) if e]
+    return sum(recalls) / len(recalls) if recalls else 1.0
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'x:d:p:q:k:B:T:')
+except getopt.GetoptError:
+    print(usage)
+    sys.exit(2)
+
+index_directory = None
+dictionary_file = None
+postings_file = None
+query_file = None
+k = 10
+postings_budgets = [1000, 10000, 100000]
+time_budgets = []
+
+for x, y in opts:
+    if x == '-x':
+        index_directory = y
+    elif x == '-d':
+        dictionary_file = y
+    elif x == '-p':
+        postings_file = y
+    elif x == '-q':
+        query_file = y
+    elif x == '-k':
+        k = int(y)
+    elif x == '-B':
+        postings_budgets = [int(b) for b in y.split(',') if b]
+    elif x == '-T':
+        time_budgets = [int(b) for b in y.split(',') if b]
+    else:
+        raise AssertionError('unhandled option')
+
+if (index_directory == None and (dictionary_file == None or postings_file == None)) or query_file == None:
+    print(usage)
+    sys.exit(2)
+
+if index_directory != None:
+    search_engine = SearchEngine.open(index_directory)
+else:
+    dictionary = load_dictionary(dictionary_file)
+    load_stem_cache(dictionary_file)
+    metadata = load_metadata(metadata_file_name(dictionary_file))
+    search_engine = SearchEngine(dictionary, load_documents('document.txt', dictionary), postings_file,
+                                 tokenizer=metadata['tokenizer'], synonyms=load_synonym_table(dictionary_file, dictionary),
+                                 impacts=load_impacts(postings_file, dictionary, metadata))
+
+with search_engine:
+    if search_engine.impacts is None:
+        print('the index has no impact ordered postings, index it with -I')
+        sys.exit(1)
+    with open(query_file, 'r', encoding='utf8') as f:
+        queries = [search_engine.parse(line.strip()) for line in f if line.strip()]
+    vector_space_model = search_engine.vector_space_model
+    # the query vectors of the first ranking pass of a free text search, expanded with synonyms.
+    query_vectors = [vector_space_model._expand_query_vector(vector_space_model._build_query_vector(query.terms))
+                     for query in queries if not query.is_boolean_query]
+    if not query_vectors:
+        print('no free text queries to rank')
+        sys.exit(1)
+
+    rank(vector_space_model, query_vectors, k) # decodes the postings lists into the cache, so timings are not cold.
+    exhaustive_rankings, milliseconds = rank(vector_space_model, query_vectors, k)
+    print(f'{len(query_vectors)} free text queries, top {k} results')
+    print(f'exhaustive: {milliseconds:.2f}ms per query')
+    for postings_budget in postings_budgets:
+        rankings, milliseconds = rank(vector_space_model, query_vectors, k, postings_budget=postings_budget)
+        print(f'{postings_budget} postings: recall@{k} {recall(rankings, exhaustive_rankings):.3f}, {milliseconds:.2f}ms per query')
+    for time_budget in time_budgets:
+        rankings, milliseconds = rank(vector_space_model, query_vectors, k, time_budget=time_budget / 1000)
+        print(f'{time_budget}ms: recall@{k} {recall(rankings, exhaustive_rankings):.3f}, {milliseconds:.2f}ms per query')
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+from searchengine import Indexer
+from searchengine.util import stem_cache
+
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+
+import getopt
+import io
+import os
+import sys
+import time
+
+usage = f'usage: {sys.argv[0]} -i dataset-file [-n number-of-documents]'
+
+def index(data_file, limit, cache_size):
+    '''
+    indexes the first limit documents of the data file into a temporary directory with a stem cache of cache_size words.
+    returns the number of seconds taken to index.
+    '''
+    stem_cache.clear()
+    stem_cache.size = cache_size
+    with TemporaryDirectory() as directory:
+        files = [os.path.join(directory, f) for f in ('postings.txt', 'dictionary.txt', 'document.txt')]
+        indexer = Indexer(*files)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            indexer.index(data_file, limit)
+        return time.perf_counter() - start
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'i:n:')
+except getopt.GetoptError:
+    print(usage)
+    sys.exit(2)
+
+data_file = None
+limit = -1
+
+for x, y in opts:
+    if x == '-i':
+        data_file = y
+    elif x == '-n':
+        limit = int(y)
+    else:
+        raise AssertionError('unhandled option')
+
+if data_file == None:
+    print(usage)
+    sys.exit(2)
+
+cache_size = stem_cache.size
+for name, size in (('without stem cache', 0), ('with stem cache', cache_size)):
+    seconds = index(data_file, limit, size)
+    words = stem_cache.hits + stem_cache.misses
+    print(f'{name}: {seconds:.2f}s, {words / seconds:.0f} words/s, {stem_cache.misses} words stemmed, {stem_cache.hits} cache hits')
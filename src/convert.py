@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+from searchengine import convert_postings_file
+from searchengine import load_dictionary
+from searchengine import postings_formats
+from searchengine import write_dictionary
+
+import getopt
+import sys
+
+usage = f'usage: {sys.argv[0]} -d dictionary-file -p postings-file -D output-dictionary-file -P output-postings-file [-f postings-format]'
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'd:p:D:P:f:')
+except getopt.GetoptError:
+    print(usage)
+    sys.exit(2)
+
+dictionary_file = None
+postings_file = None
+output_dictionary_file = None
+output_postings_file = None
+postings_format = 'binary'
+
+for x, y in opts:
+    if x == '-d':
+        dictionary_file = y
+    elif x == '-p':
+        postings_file = y
+    elif x == '-D':
+        output_dictionary_file = y
+    elif x == '-P':
+        output_postings_file = y
+    elif x == '-f':
+        postings_format = y
+    else:
+        raise AssertionError('unhandled option')
+
+if None in (dictionary_file, postings_file, output_dictionary_file, output_postings_file) or postings_format not in postings_formats:
+    print(usage)
+    sys.exit(2)
+
+if postings_file == output_postings_file:
+    print('output postings file must be different from the postings file')
+    sys.exit(2)
+
+dictionary = load_dictionary(dictionary_file)
+dictionary = convert_postings_file(dictionary, postings_file, output_postings_file, postings_format)
+print(f'saved {postings_format} postings lists to {output_postings_file}')
+write_dictionary(dictionary, output_dictionary_file)
+print(f'saved dictionary to {output_dictionary_file}')
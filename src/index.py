@@ -1,18 +1,37 @@
 #!/usr/bin/python3
 from searchengine import Indexer
+from searchengine import add_segment
+from searchengine import build_index
+from searchengine import delete_documents
+from searchengine import impacts_file_name
+from searchengine import postings_formats
+from searchengine import stems_file_name
+from searchengine import tokenizers
 
 import getopt
+import os
 import sys
 
+usage = f'usage: {sys.argv[0]} -i dataset-file (-x index-directory [-a] [-r deletions-file] | -d dictionary-file -p postings-file) [-f postings-format] [-m memory-limit] [-w workers] [-s] [-t tokenizer] [-I]'
+
 try:
-    opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:')
+    opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:x:ar:f:m:w:st:I')
 except getopt.GetoptError:
-    print(f'usage: {sys.argv[0]} -i dataset-file -d dictionary-file -p postings-file')
+    print(usage)
     sys.exit(2)
 
 data_file = None
 dictionary_file = None
 postings_file = None
+index_directory = None
+append = False
+deletions_file = None
+postings_format = 'binary'
+memory_limit = None
+workers = 1
+save_stems = False
+tokenizer = 'nltk'
+save_impacts = False
 
 for x, y in opts:
     if x == '-i':
@@ -21,18 +40,50 @@ for x, y in opts:
         dictionary_file = y
     elif x == '-p':
         postings_file = y
+    elif x == '-x':
+        index_directory = y
+    elif x == '-a':
+        append = True
+    elif x == '-r':
+        deletions_file = y
+    elif x == '-f':
+        postings_format = y
+    elif x == '-m':
+        memory_limit = int(y) * 1024 * 1024
+    elif x == '-w':
+        workers = int(y)
+    elif x == '-s':
+        save_stems = True
+    elif x == '-t':
+        tokenizer = y
+    elif x == '-I':
+        save_impacts = True
     else:
         raise AssertionError('unhandled option')
 
-if data_file == None or dictionary_file == None or postings_file == None:
-    print(f'usage: {sys.argv[0]} -i dataset-file -d dictionary-file -p postings-file')
+if (data_file == None and deletions_file == None) or (index_directory == None and (dictionary_file == None or postings_file == None or append or deletions_file != None)) or postings_format not in postings_formats or tokenizer not in tokenizers:
+    print(usage)
     sys.exit(2)
 
+if index_directory != None:
+    if deletions_file != None:
+        with open(deletions_file, 'r', encoding='utf8') as f:
+            delete_documents(index_directory, [int(line) for line in f if line.strip()])
+    if data_file != None and append:
+        add_segment(data_file, index_directory, postings_format, memory_limit, workers, save_stems, save_impacts=save_impacts)
+    elif data_file != None:
+        build_index(data_file, index_directory, postings_format, memory_limit, workers, tokenizer, save_stems, save_impacts=save_impacts)
+    sys.exit(0)
+
 document_file = 'document.txt'
 open(postings_file, 'w+', encoding='utf8').close()
 open(dictionary_file, 'w+', encoding='utf8').close()
 open(document_file, 'w+', encoding='utf8').close()
 
-indexer = Indexer(postings_file, dictionary_file, document_file)
+stems_file = stems_file_name(dictionary_file) if save_stems else None
+impacts_file = impacts_file_name(postings_file) if save_impacts else None
+if impacts_file == None and os.path.exists(impacts_file_name(postings_file)):
+    os.remove(impacts_file_name(postings_file)) # left by an earlier index of the postings file.
+indexer = Indexer(postings_file, dictionary_file, document_file, postings_format, memory_limit, workers, stems_file, tokenizer, impacts_file)
 indexer.index(data_file)
 
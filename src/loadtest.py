@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+from searchengine import AsyncSearchEngine
+from searchengine import ParseError
+from searchengine import SearchEngine
+from searchengine import default_cache_bytes
+from searchengine import load_dictionary
+from searchengine import load_documents
+from searchengine import load_metadata
+from searchengine import load_stem_cache
+from searchengine import load_synonym_table
+from searchengine import metadata_file_name
+
+import asyncio
+import getopt
+import sys
+import time
+
+usage = f'usage: {sys.argv[0]} (-x index-directory | -d dictionary-file -p postings-file) -q file-of-queries [-j concurrency] [-r requests] [-k number-of-results] [-t timeout-milliseconds] [-w workers] [-c cache-megabytes]'
+
+def percentile(latencies, p):
+    '''
+    gets the p-th percentile of the sorted latencies, by the nearest rank.
+    '''
+    return latencies[min(len(latencies) - 1, max(0, round(p / 100 * len(latencies)) - 1))]
+
+async def run(async_search_engine, queries, concurrency, requests, k):
+    '''
+    searches requests queries, cycling through the queries, with concurrency searches in flight at any time.
+    returns the latencies of the searches that finished in seconds, the number of searches that timed out,
+    and the number of seconds taken.
+    '''
+    latencies = []
+    timeouts = 0
+    next_request = 0
+
+    async def client():
+        nonlocal next_request, timeouts
+        while next_request < requests:
+            line = queries[next_request % len(queries)]
+            next_request += 1
+            start = time.perf_counter()
+            try:
+                await async_search_engine.search(line, [], k)
+            except asyncio.TimeoutError:
+                timeouts += 1
+                continue
+            except ParseError:
+                pass
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies, timeouts, time.perf_counter() - start
+
+async def main(search_engine, queries, concurrency, requests, k, timeout, workers):
+    async with AsyncSearchEngine(search_engine, timeout, workers) as async_search_engine:
+        latencies, timeouts, seconds = await run(async_search_engine, queries, concurrency, requests, k)
+        cache = str(search_engine.postings_file.cache)
+    latencies.sort()
+    print(f'{requests} requests, concurrency {concurrency}: {requests / seconds:.1f} requests/s, {timeouts} timed out')
+    if latencies:
+        print(f'p50: {1000 * percentile(latencies, 50):.2f}ms, p99: {1000 * percentile(latencies, 99):.2f}ms, '
+              f'max: {1000 * latencies[-1]:.2f}ms')
+    print(f'postings cache: {cache}')
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'x:d:p:q:j:r:k:t:w:c:')
+except getopt.GetoptError:
+    print(usage)
+    sys.exit(2)
+
+index_directory = None
+dictionary_file = None
+postings_file = None
+query_file = None
+concurrency = 8
+requests = 1000
+k = 10
+timeout = None
+workers = 4
+cache_bytes = default_cache_bytes
+
+for x, y in opts:
+    if x == '-x':
+        index_directory = y
+    elif x == '-d':
+        dictionary_file = y
+    elif x == '-p':
+        postings_file = y
+    elif x == '-q':
+        query_file = y
+    elif x == '-j':
+        concurrency = int(y)
+    elif x == '-r':
+        requests = int(y)
+    elif x == '-k':
+        k = int(y)
+    elif x == '-t':
+        timeout = int(y) / 1000
+    elif x == '-w':
+        workers = int(y)
+    elif x == '-c':
+        cache_bytes = int(y) * 1024 * 1024
+    else:
+        raise AssertionError('unhandled option')
+
+if (index_directory == None and (dictionary_file == None or postings_file == None)) or query_file == None:
+    print(usage)
+    sys.exit(2)
+
+with open(query_file, 'r', encoding='utf8') as f:
+    queries = [line.strip() for line in f if line.strip()]
+if not queries:
+    print('no queries to search')
+    sys.exit(1)
+
+if index_directory != None:
+    search_engine = SearchEngine.open(index_directory, cache_bytes)
+else:
+    dictionary = load_dictionary(dictionary_file)
+    load_stem_cache(dictionary_file)
+    metadata = load_metadata(metadata_file_name(dictionary_file))
+    search_engine = SearchEngine(dictionary, load_documents('document.txt', dictionary), postings_file, cache_bytes,
+                                 tokenizer=metadata['tokenizer'], synonyms=load_synonym_table(dictionary_file, dictionary))
+
+asyncio.run(main(search_engine, queries, concurrency, requests, k, timeout, workers))
@@ -0,0 +1,27 @@
+#!/usr/bin/python3
+from searchengine import merge_segments
+
+import getopt
+import sys
+
+usage = f'usage: {sys.argv[0]} -x index-directory'
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'x:')
+except getopt.GetoptError:
+    print(usage)
+    sys.exit(2)
+
+index_directory = None
+
+for x, y in opts:
+    if x == '-x':
+        index_directory = y
+    else:
+        raise AssertionError('unhandled option')
+
+if index_directory == None:
+    print(usage)
+    sys.exit(2)
+
+merge_segments(index_directory)
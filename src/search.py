@@ -1,11 +1,20 @@
 #!/usr/bin/python3
-from searchengine import Query
 from searchengine import ParseError
 from searchengine import SearchEngine
+from searchengine import default_cache_bytes
+from searchengine import engines
+from searchengine import read_batch
+from searchengine import search_batch
 from searchengine import load_dictionary
 from searchengine import load_documents
+from searchengine import load_impacts
+from searchengine import load_stem_cache
+from searchengine import load_synonym_table
+from searchengine import load_metadata
+from searchengine import metadata_file_name
 
 import getopt
+import json
 import sys
 
 def read_query(query_file):
@@ -17,45 +26,90 @@ def read_query(query_file):
         while line:
             relevant_doc_ids.append(int(line.strip()))
             line = f.readline()
-    return Query.parse(query), relevant_doc_ids
+    return query, relevant_doc_ids
+
+usage = f'usage: {sys.argv[0]} (-x index-directory | -d dictionary-file -p postings-file) -q file-of-queries -o output-file-of-results [-b] [-w workers] [-k number-of-results] [-e engine] [-c cache-megabytes] [-B postings-budget] [-T time-budget-milliseconds]'
 
 try:
-    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
+    opts, args = getopt.getopt(sys.argv[1:], 'd:p:x:q:o:bw:k:e:c:B:T:')
 except getopt.GetoptError:
-    print(f'usage: {sys.argv[0]} -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results')
+    print(usage)
     sys.exit(2)
 
 dictionary_file = None
 postings_file = None
+index_directory = None
 query_file = None
 results_file = None
+batch = False
+workers = 1
+k = None
+engine = 'python'
+cache_bytes = default_cache_bytes
+postings_budget = None
+time_budget = None
 
 for x, y in opts:
     if x == '-d':
         dictionary_file = y
     elif x == '-p':
         postings_file = y
+    elif x == '-x':
+        index_directory = y
     elif x == '-q':
         query_file = y
     elif x == '-o':
         results_file = y
+    elif x == '-b':
+        batch = True
+    elif x == '-w':
+        workers = int(y)
+    elif x == '-k':
+        k = int(y)
+    elif x == '-e':
+        engine = y
+    elif x == '-c':
+        cache_bytes = int(y) * 1024 * 1024
+    elif x == '-B':
+        postings_budget = int(y)
+    elif x == '-T':
+        time_budget = int(y) / 1000
     else:
         raise AssertionError('unhandled option')
 
-if dictionary_file == None or postings_file == None or query_file == None or results_file == None:
-    print(f'usage: {sys.argv[0]} -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results')
+if (index_directory == None and (dictionary_file == None or postings_file == None)) or query_file == None or results_file == None or engine not in engines:
+    print(usage)
     sys.exit(2)
 
 document_file = 'document.txt'
-dictionary = load_dictionary(dictionary_file)
-documents = load_documents(document_file)
-search_engine = SearchEngine(dictionary, documents, postings_file)
-query, relevant_doc_ids = read_query(query_file)
 
-with open(results_file, 'w') as f:
+if batch:
+    results = search_batch(read_batch(query_file), dictionary_file, postings_file, document_file, workers, cache_bytes, engine=engine, k=k, index_directory=index_directory)
+    with open(results_file, 'w', encoding='utf8') as f:
+        for result in results:
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+    sys.exit(0)
+
+if index_directory != None:
+    search_engine = SearchEngine.open(index_directory, cache_bytes, engine)
+else:
+    dictionary = load_dictionary(dictionary_file)
+    documents = load_documents(document_file, dictionary)
+    load_stem_cache(dictionary_file)
+    metadata = load_metadata(metadata_file_name(dictionary_file))
+    synonyms = load_synonym_table(dictionary_file, dictionary)
+    impacts = load_impacts(postings_file, dictionary, metadata)
+    search_engine = SearchEngine(dictionary, documents, postings_file, cache_bytes, engine, metadata['tokenizer'], synonyms, impacts)
+search_engine.vector_space_model.postings_budget = postings_budget
+search_engine.vector_space_model.time_budget = time_budget
+line, relevant_doc_ids = read_query(query_file)
+
+with search_engine, open(results_file, 'w') as f:
     f.seek(0)
     try:
-        result = search_engine.search(query, relevant_doc_ids)
+        query = search_engine.parse(line)
+        result = search_engine.search(query, relevant_doc_ids, k)
         f.write(' '.join([str(i) for i in result]) + '\n')
     except ParseError as e:
         f.write(f'parse error encountered: {e}')
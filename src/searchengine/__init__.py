@@ -1,8 +1,38 @@
+from .asyncsearch import AsyncSearchEngine
+from .batch import read_batch
+from .batch import search_batch
+from .impacts import ImpactFile
+from .impacts import impacts_file_name
+from .impacts import load_impacts
+from .indexdirectory import add_segment
+from .indexdirectory import build_index
+from .indexdirectory import delete_documents
+from .indexdirectory import load_manifest
+from .indexdirectory import merge_segments
+from .indexdirectory import verify_index
 from .indexer import Indexer
+from .postingsfile import PostingsCache
+from .postingsfile import PostingsFile
+from .postingsfile import convert_postings_file
+from .postingsfile import positions_file_name
+from .postingsfile import postings_formats
+from .postingsfile import write_postings_file
 from .query import Query
 from .query import ParseError
+from .resultcache import ResultCache
 from .searchengine import SearchEngine
+from .searchengine import default_cache_bytes
+from .server import SearchServer
+from .synonyms import load_synonym_table
+from .synonyms import synonyms_file_name
+from .tokenizer import tokenizers
+from .vectorspacemodel import default_max_query_terms
+from .vectorspacemodel import engines
 from .util import write_dictionary
 from .util import write_documents
 from .util import load_dictionary
 from .util import load_documents
+from .util import load_stem_cache
+from .util import stems_file_name
+from .util import load_metadata
+from .util import metadata_file_name
@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .postingsfile import postings_list_bytes
+
+import asyncio
+
+class AsyncSearchEngine:
+    '''
+    asyncio front end of a search engine, so several queries can be awaited at once.
+    the postings lists of the terms of a query are read and decoded concurrently on a pool of threads before the query
+    is searched, and a postings list that is already being read for another query is awaited rather than read again.
+    the search engine is not thread safe, so queries are parsed and searched one at a time on a single search thread,
+    which is also the only thread that adds the prefetched postings lists to the postings cache.
+    prefetching only helps when the search engine has a postings cache, as the search reads its postings from the cache.
+
+    search_engine -> search engine to run queries on.
+    timeout -> default number of seconds a search may take, None does not limit it.
+    workers -> number of threads to read postings lists with.
+    fetches -> dictionary of term -> future of its postings list, for the postings lists being read.
+    '''
+
+    def __init__(self, search_engine, timeout=None, workers=4):
+        self.search_engine = search_engine
+        self.timeout = timeout
+        self.workers = workers
+        self.fetches = {}
+        self._search_executor = ThreadPoolExecutor(1, thread_name_prefix='search')
+        self._read_executor = ThreadPoolExecutor(workers, thread_name_prefix='postings')
+
+    async def search(self, line, relevant_doc_ids, k=None, offset=0, timeout=None):
+        '''
+        parses the query line and runs it on the search engine, like SearchEngine.search.
+        raises asyncio.TimeoutError if the search takes longer than timeout seconds (or the default timeout).
+        a search that times out or is cancelled is dropped if it has not started on the search thread,
+        a search that has started runs to the end and its result is discarded.
+        postings lists being read for it are still read for the other queries waiting on them.
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._search(line, relevant_doc_ids, k, offset), timeout)
+
+    async def _search(self, line, relevant_doc_ids, k, offset):
+        '''
+        parses the query, prefetches the postings lists of its terms, then searches it.
+        '''
+        loop = asyncio.get_running_loop()
+        query = await loop.run_in_executor(self._search_executor, self.search_engine.parse, line)
+        postings_lists = await self.prefetch(self._get_terms(query))
+        return await loop.run_in_executor(self._search_executor, self._run, query, relevant_doc_ids, k, offset,
+                                          postings_lists)
+
+    def _get_terms(self, query):
+        '''
+        gets the terms of a query whose postings lists are read by a search, the words of its phrases,
+        and the synonyms of the terms of a free text query if the search engine has a synonym table.
+        '''
+        terms = []
+        for term in query.terms:
+            terms.extend([t for t in term.split(' ') if t])
+        synonyms = self.search_engine.synonyms
+        if not query.is_boolean_query and synonyms is not None:
+            terms.extend([s for t in terms for s in synonyms.get_synonyms(t)])
+        return list(dict.fromkeys(terms))
+
+    async def prefetch(self, terms):
+        '''
+        reads the postings lists of the terms that are not cached concurrently.
+        returns a list of (offset, postings list) pairs of the postings lists that were read.
+        '''
+        loop = asyncio.get_running_loop()
+        cache = self.search_engine.postings_file.cache
+        if cache.budget <= 0:
+            return []
+        futures = []
+        for term in terms:
+            future = self.fetches.get(term)
+            if future is None:
+                future = loop.run_in_executor(self._read_executor, self._read, term)
+                self.fetches[term] = future
+                future.add_done_callback(lambda _, term=term: self.fetches.pop(term, None))
+            futures.append(future)
+        # shielded, so a search that is cancelled does not cancel the reads other searches are waiting on.
+        results = await asyncio.gather(*[asyncio.shield(f) for f in futures])
+        return [result for result in results if result is not None and result[0] not in cache]
+
+    def _read(self, term):
+        '''
+        reads and decodes the postings list of a term on a read thread, without touching the postings cache.
+        returns the (offset, postings list) pair, or None if the term is not in the dictionary or is cached.
+        '''
+        dictionary = self.search_engine.dictionary
+        postings_file = self.search_engine.postings_file
+        if term not in dictionary:
+            return None
+        offset = dictionary[term].offset
+        if offset in postings_file.cache:
+            return None
+        return offset, postings_file._read(offset)
+
+    def _run(self, query, relevant_doc_ids, k, offset, postings_lists):
+        '''
+        adds the prefetched postings lists to the postings cache and searches the query, on the search thread.
+        '''
+        cache = self.search_engine.postings_file.cache
+        for postings_offset, postings_list in postings_lists:
+            if postings_offset not in cache:
+                cache.put(postings_offset, postings_list, postings_list_bytes(postings_list))
+        return self.search_engine.search(query, relevant_doc_ids, k, offset)
+
+    def close(self):
+        '''
+        waits for the running reads and searches, then closes the search engine.
+        '''
+        self._read_executor.shutdown()
+        self._search_executor.shutdown()
+        self.search_engine.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
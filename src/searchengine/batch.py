@@ -0,0 +1,87 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from .query import ParseError
+from .searchengine import SearchEngine
+from .searchengine import default_cache_bytes
+from .synonyms import load_synonym_table
+from .vectorspacemodel import python_engine
+from .util import load_dictionary
+from .util import load_documents
+from .util import load_metadata
+from .util import metadata_file_name
+from .util import load_stem_cache
+
+import json
+
+# search engine of the current process, opened once per worker process.
+_search_engine = None
+
+def read_batch(batch_file):
+    '''
+    generates (query, relevant doc ids) pairs from a batch file.
+    each line of the batch file is a json object: {"query": <query>, "relevant_doc_ids": [<doc id>, ...]}
+    relevant_doc_ids is optional. blank lines are skipped.
+    '''
+    with open(batch_file, 'r', encoding='utf8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            yield request['query'], [int(d) for d in request.get('relevant_doc_ids', [])]
+
+# number of results to return per query, None for the full ranking.
+_k = None
+
+def _open_search_engine(dictionary_file, postings_file, document_file, cache_bytes, engine, k, index_directory):
+    '''
+    opens the search engine of the current process, on the index directory if it is given, otherwise on the index files.
+    '''
+    global _search_engine, _k
+    _k = k
+    if index_directory is not None:
+        _search_engine = SearchEngine.open(index_directory, cache_bytes, engine)
+        return
+    dictionary = load_dictionary(dictionary_file)
+    documents = load_documents(document_file, dictionary)
+    load_stem_cache(dictionary_file)
+    metadata = load_metadata(metadata_file_name(dictionary_file))
+    synonyms = load_synonym_table(dictionary_file, dictionary)
+    _search_engine = SearchEngine(dictionary, documents, postings_file, cache_bytes, engine, metadata['tokenizer'], synonyms)
+
+def _search(request):
+    '''
+    parses and runs a single query of a batch on the search engine of the current process.
+    '''
+    line, relevant_doc_ids = request
+    try:
+        query = _search_engine.parse(line)
+        return {'query': line, 'results': _search_engine.search(query, relevant_doc_ids, _k)}
+    except ParseError as e:
+        return {'query': line, 'error': f'parse error encountered: {e}'}
+
+def search_batch(requests, dictionary_file, postings_file, document_file, workers=1, cache_bytes=default_cache_bytes, chunk_size=16, engine=python_engine, k=None, index_directory=None):
+    '''
+    runs a batch of (query, relevant doc ids) requests against the index, generating a result
+    for each request in the same order as the requests, as soon as it is available.
+    a result is {"query": <query>, "results": [<doc id>, ...]}, or {"query": <query>, "error": <message>}
+    if the query fails to parse. only the top k results of each query are returned if k is given.
+    free text queries are ranked with the given vector space model engine.
+    if index_directory is given, the index is opened from it, and the index files are not used.
+
+    each process opens the index once and keeps a cache of up to cache_bytes of decoded postings lists,
+    so postings reads are shared across queries that reuse terms.
+    with more than one worker, requests are run on a pool of worker processes,
+    handing chunk_size consecutive requests to a worker at a time.
+    '''
+    search_engine_args = (dictionary_file, postings_file, document_file, cache_bytes, engine, k, index_directory)
+    if workers <= 1:
+        _open_search_engine(*search_engine_args)
+        try:
+            for request in requests:
+                yield _search(request)
+        finally:
+            _search_engine.close()
+        return
+    with ProcessPoolExecutor(workers, initializer=_open_search_engine, initargs=search_engine_args) as executor:
+        for result in executor.map(_search, requests, chunksize=chunk_size):
+            yield result
@@ -1,6 +1,4 @@
-from functools import reduce
 from .postingslist import PostingsList
-from .util import read_line_from_file
 from .util import stem
 
 class BooleanRetrievalModel:
@@ -10,7 +8,7 @@ class BooleanRetrievalModel:
     if a term is a phrase, the terms positioning is enforced when filtering doc ids.
 
     dictionary -> dictionary of terms which holds data to allow retrieval of the postings lists.
-    postings_file -> file to read from to obtain postings lists.
+    postings_file -> postings file object to read postings lists from.
     '''
 
     def __init__(self, dictionary, postings_file):
@@ -22,48 +20,141 @@ class BooleanRetrievalModel:
         gets the term's postings list.
         returns an empty postings list if term is not in dictionary.
         '''
-        if term not in self.dictionary:
+        entry = self.dictionary.get(term)
+        if entry is None:
             return PostingsList()
-        offset = self.dictionary[term].offset
-        line = read_line_from_file(self.postings_file, offset)
-        return PostingsList.parse(line).decompress()
+        return self.postings_file.read(entry.offset)
+
+    def get_doc_frequency(self, token):
+        '''
+        gets the doc frequency of a token, the doc frequency of its rarest term if it is a phrase.
+        terms that are not in the dictionary have a doc frequency of 0.
+        '''
+        terms = self._get_phrase_terms(token) if self._is_phrase(token) else [token]
+        return min([self._get_term_doc_frequency(t) for t in terms])
+
+    def _get_term_doc_frequency(self, term):
+        '''
+        gets the doc frequency of a term, 0 if it is not in the dictionary.
+        '''
+        entry = self.dictionary.get(term)
+        return 0 if entry is None else entry.doc_frequency
 
     def retrieve(self, tokens):
         '''
         retrieves a set of document ids by searching each token
         and taking the intersection of each result in each token,
         where each token can be a single term or a phrase.
+        tokens are searched rarest first, by their doc frequency: the rarest token gives the candidate doc ids,
+        and each following token only keeps the candidates it matches.
+        a term skips through its postings to the candidates with a postings cursor,
+        so the postings of common terms are mostly skipped rather than decoded.
         '''
-        output = [set(self._search_token(t)) for t in tokens]
-        if output:
-            return reduce(lambda x, y: x.intersection(y), output[1:], output[0])
-        else:
+        if not tokens:
             return set()
+        tokens = sorted(tokens, key=self.get_doc_frequency)
+        doc_ids = sorted(set(self._search_token(tokens[0])))
+        for token in tokens[1:]:
+            if not doc_ids:
+                break
+            if self._is_phrase(token):
+                doc_ids = self._search_phrase(token, doc_ids)
+            else:
+                doc_ids = self._filter_term(doc_ids, token)
+        return set(doc_ids)
 
+    def _filter_term(self, doc_ids, term):
+        '''
+        gets the doc ids, given in increasing order, of the documents that contain the term.
+        '''
+        entry = self.dictionary.get(term)
+        if entry is None:
+            return []
+        cursor = self.postings_file.cursor(entry.offset)
+        output = []
+        for doc_id in doc_ids:
+            cursor.next_geq(doc_id)
+            if cursor.doc_id() is None:
+                break
+            if cursor.doc_id() == doc_id:
+                output.append(doc_id)
+        return output
+
+    def _is_phrase(self, token):
+        '''
+        checks if the token is a phrase of more than one term.
+        '''
+        return len(token.strip().split(' ')) > 1
+
+    def _get_phrase_terms(self, phrase):
+        '''
+        gets the terms of a phrase, in phrase order.
+        '''
+        return [t.strip().casefold() for t in phrase.split(' ')]
 
     def _search_token(self, token):
         '''
         gets the results from searching the token in the boolean retrieval model.
         the token can either be a phrase or a single term.
         '''
-        is_phrase = len(token.strip().split(' ')) > 1
-        if is_phrase:
+        if self._is_phrase(token):
             return self._search_phrase(token)
         else:
             return self._search_term(token)
 
-    def _search_phrase(self, phrase):
+    def _search_phrase(self, phrase, doc_ids=None):
+        '''
+        gets the result of searching the phrase in the boolean retrieval model, in increasing doc id order.
+        if doc_ids is given, in increasing order, only those documents are searched.
+        the phrase is matched from its rarest term: the documents of the rarest term are the candidates,
+        each with the positions the phrase would start at, which are the positions of the term minus its offset in the phrase.
+        the other terms are matched from the next rarest, only for the candidates that are left:
+        a term skips through its postings to the candidates, and a candidate keeps the start positions
+        where the term occurs at its offset, or is dropped if none are left.
+        matching stops as soon as there are no candidates left.
+        '''
+        phrase_terms = self._get_phrase_terms(phrase)
+        entries = {term: self.dictionary.get(term) for term in phrase_terms} # each term is looked up once.
+        if any(entry is None for entry in entries.values()):
+            return []
+        terms = sorted(enumerate(phrase_terms), key=lambda x: entries[x[1]].doc_frequency)
+
+        offset, term = terms[0]
+        cursor = self.postings_file.cursor(entries[term].offset)
+        candidates = {} # doc_id -> start positions of the phrase.
+        if doc_ids is None:
+            while cursor.doc_id() is not None:
+                candidates.setdefault(cursor.doc_id(), set()).update(p - offset for p in cursor.posting().positions)
+                cursor.next()
+        else:
+            for doc_id in doc_ids:
+                positions = self._get_positions(cursor, doc_id)
+                if positions:
+                    candidates[doc_id] = {p - offset for p in positions}
+
+        for offset, term in terms[1:]:
+            if not candidates:
+                break
+            cursor = self.postings_file.cursor(entries[term].offset)
+            for doc_id in sorted(candidates):
+                starts = candidates[doc_id].intersection(p - offset for p in self._get_positions(cursor, doc_id))
+                if starts:
+                    candidates[doc_id] = starts
+                else:
+                    del candidates[doc_id]
+        return sorted(candidates)
+
+    def _get_positions(self, cursor, doc_id):
         '''
-        gets the result of searching the phrase in the boolean retrieval model.
-        the postings lists are obtained for each term in the phrase.
-        then, they are merged from left to right, checking for proximity of 1.
-        this reduction ensures the positions of the terms in the phrase are enforced 
-        when finding matching document ids.
+        skips the cursor to the postings of the doc id, and gets their positions.
+        a document with several rows in the data file has a posting per row, with positions that continue across rows.
         '''
-        phrase_terms = [t.strip().casefold() for t in phrase.split(' ')]
-        postings_lists = [self.get_postings_list(t) for t in phrase_terms]
-        result = reduce(lambda x, y: PostingsList.merge(x, y, 1), postings_lists)
-        return [p.doc_id for p in result]
+        cursor.next_geq(doc_id)
+        positions = []
+        while cursor.doc_id() == doc_id:
+            positions.extend(cursor.posting().positions)
+            cursor.next()
+        return positions
 
     def _search_term(self, term):
         '''
@@ -0,0 +1,341 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from pickle import dump
+from pickle import load
+
+from .document import Document
+from .lexicon import Lexicon
+from .lexicon import term_ids
+
+import mmap
+import struct
+import sys
+
+_documents_magic = b'LCRDOCUMENTS'
+_documents_version = 2
+_documents_header = _documents_magic + bytes([_documents_version])
+
+# document stores of version 1 hold the vector weights before they are divided by the document lengths.
+_unnormalized_version = 1
+
+# number of documents and number of vector entries, after the header.
+_counts = struct.Struct('<QQ')
+
+# the columns start after the header and counts, padded so every column is aligned to 8 bytes.
+_columns_offset = 32
+
+# a column is read whole by Column.get_many when more than 1 / _scan_ratio of its rows are looked up.
+_scan_ratio = 10
+
+def is_document_store_file(file_name):
+    '''
+    checks if file_name is a document store file, from its header.
+    '''
+    with open(file_name, 'rb') as f:
+        return f.read(len(_documents_magic)) == _documents_magic
+
+def document_data_file_name(document_file):
+    '''
+    gets the name of the file that holds the titles, dates and courts of the documents of a document store.
+    '''
+    return f'{document_file}.data'
+
+def write_document_store(documents, dictionary, file_to_write):
+    '''
+    writes a dictionary of doc_id -> document objects to file_to_write as columns,
+    with the terms of the document vectors numbered by their ids in the lexicon of dictionary.
+    the vectors are written normalized, so relevance feedback sums them without dividing each weight again.
+    layout, with integers and floats in little endian:
+    header -> magic and version, and the number of documents and vector entries, padded to _columns_offset.
+    doc ids -> sorted doc ids, 8 bytes each.
+    lengths -> length of each document, 8 bytes each.
+    vector offsets -> start of each document's vector in the vector columns, and the end of the last vector, 8 bytes each.
+    vector weights -> weights of the normalized vectors, 8 bytes each.
+    vector term ids -> term ids of the vectors, 4 bytes each.
+    the titles, dates and courts of the documents are pickled to a separate data file, see document_data_file_name.
+    '''
+    ids = term_ids(dictionary)
+    doc_ids = sorted(documents)
+    vector_offsets = [0]
+    vector_term_ids = []
+    vector_weights = []
+    for doc_id in doc_ids:
+        length = documents[doc_id].length
+        for term, weight in documents[doc_id].vector.items():
+            vector_term_ids.append(ids[term])
+            vector_weights.append(weight / length if length else 0)
+        vector_offsets.append(len(vector_term_ids))
+
+    size = len(doc_ids)
+    entries = len(vector_term_ids)
+    with open(file_to_write, 'wb') as f:
+        f.write(_documents_header)
+        f.write(_counts.pack(size, entries))
+        f.write(bytes(_columns_offset - len(_documents_header) - _counts.size))
+        f.write(struct.pack(f'<{size}q', *doc_ids))
+        f.write(struct.pack(f'<{size}d', *[documents[d].length for d in doc_ids]))
+        f.write(struct.pack(f'<{size + 1}Q', *vector_offsets))
+        f.write(struct.pack(f'<{entries}d', *vector_weights))
+        f.write(struct.pack(f'<{entries}I', *vector_term_ids))
+    with open(document_data_file_name(file_to_write), 'wb') as f:
+        dump({doc_id: documents[doc_id].data for doc_id in doc_ids}, f)
+
+def get_lengths(documents):
+    '''
+    gets a mapping of doc_id -> document length, which is the lengths column of a document store
+    (or of segmented documents), or is built from the lengths of a dictionary of document objects.
+    '''
+    if hasattr(documents, 'lengths'):
+        return documents.lengths
+    return {doc_id: doc.length for doc_id, doc in documents.items()}
+
+def get_many(column, doc_ids):
+    '''
+    gets a mapping of doc_id -> value of the doc ids from a column, such as the lengths of the documents a query scored.
+    a column of a document store looks the doc ids up together (see Column.get_many), other mappings are returned as is.
+    '''
+    if isinstance(column, Column):
+        return column.get_many(doc_ids)
+    return column
+
+def sum_normalized_vectors(documents, doc_ids):
+    '''
+    sums the normalized vectors of the documents of doc_ids that are in documents, as a dictionary of term -> weight.
+    returns the sum and the number of vectors summed.
+    vectors of document stores are summed by term id straight from their columns, without building a dictionary
+    per document, and each term id is only looked up in the lexicon once. term ids are numbered by the lexicon of
+    each document store, so the vectors of segmented documents are summed per segment.
+    '''
+    stores = {} # id of document store -> (document store, dictionary of term id -> weight).
+    vector = {}
+    count = 0
+    for doc_id in doc_ids:
+        document = documents.get(doc_id)
+        if document is None:
+            continue
+        count += 1
+        if isinstance(document, StoredDocument):
+            store, weights = stores.setdefault(id(document.store), (document.store, {}))
+            for term_id, weight in zip(*document.store.get_normalized_vector_columns(document.row)):
+                weights[term_id] = weights.get(term_id, 0) + weight
+        elif document.length:
+            for term, weight in document.get_normalized_vector().items():
+                vector[term] = vector.get(term, 0) + weight
+    for store, weights in stores.values():
+        for term_id, weight in weights.items():
+            term = store.get_term(term_id)
+            vector[term] = vector.get(term, 0) + weight
+    return vector, count
+
+class Column(Mapping):
+    '''
+    read only mapping of doc_id -> value of a column of a document store.
+    doc ids are binary searched in the doc ids column.
+
+    doc_ids -> sorted doc ids column.
+    values -> values column, in the same order as doc_ids.
+    '''
+
+    def __init__(self, doc_ids, values):
+        self.doc_ids = doc_ids
+        self.values = values
+
+    def __getitem__(self, doc_id):
+        row = bisect_left(self.doc_ids, doc_id)
+        if row == len(self.doc_ids) or self.doc_ids[row] != doc_id:
+            raise KeyError(doc_id)
+        return self.values[row]
+
+    def __iter__(self):
+        return iter(self.doc_ids)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def get_many(self, doc_ids):
+        '''
+        gets a dictionary of doc_id -> value of the doc ids, raises a KeyError if a doc id is not in the column.
+        a few doc ids are binary searched one at a time, but once they are more than 1 / _scan_ratio of the rows,
+        the whole column is read in one pass instead, which is faster than searching each of them.
+        '''
+        if len(doc_ids) * _scan_ratio <= len(self.doc_ids):
+            return {doc_id: self[doc_id] for doc_id in doc_ids}
+        values = dict(zip(self.doc_ids, self.values))
+        return {doc_id: values[doc_id] for doc_id in doc_ids}
+
+class DocumentStore(Mapping):
+    '''
+    read only dictionary of doc_id -> document objects, read from a memory mapped document store file
+    (see write_document_store). the columns are read straight from the mapped buffer, so ranking only
+    touches the lengths column, and the data file of titles, dates and courts is only loaded when
+    a document's data is accessed.
+    documents are returned as StoredDocument views, which read their columns when accessed.
+
+    file_name -> name of the document store file.
+    dictionary -> dictionary the document store was written with, to get the terms of the vectors from their ids,
+                  or None if the vectors are not read.
+    buffer -> memory mapped contents of the document store file.
+    doc_ids -> sorted doc ids column.
+    lengths -> column of doc_id -> document length.
+    normalized -> whether the vector weights are normalized, document stores of version 1 are normalized when read.
+    '''
+
+    def __init__(self, file_name, dictionary):
+        self.file_name = file_name
+        self.dictionary = dictionary
+        self._file = open(file_name, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        version = self.buffer[len(_documents_magic)]
+        if self.buffer[:len(_documents_magic)] != _documents_magic or version not in (_unnormalized_version, _documents_version):
+            self.close()
+            raise ValueError(f'unsupported document store format version: {file_name}')
+        self.normalized = version != _unnormalized_version
+        size, entries = _counts.unpack_from(self.buffer, len(_documents_header))
+        offset = _columns_offset
+        self.doc_ids = self._column(offset, size, 'q')
+        offset += 8 * size
+        self.lengths = Column(self.doc_ids, self._column(offset, size, 'd'))
+        offset += 8 * size
+        self._vector_offsets = self._column(offset, size + 1, 'Q')
+        offset += 8 * (size + 1)
+        self._vector_weights = self._column(offset, entries, 'd')
+        offset += 8 * entries
+        self._vector_term_ids = self._column(offset, entries, 'I')
+        if dictionary is None:
+            self._term = None
+        elif isinstance(dictionary, Lexicon):
+            self._term = dictionary.term
+        else:
+            self._term = sorted(dictionary, key=lambda t: t.encode('utf8')).__getitem__
+        self._data = None
+
+    def _column(self, offset, count, type_code):
+        '''
+        gets a column of count values of the type code at offset of the buffer.
+        on little endian machines the column is a view of the buffer, otherwise it is copied and byte swapped.
+        '''
+        view = memoryview(self.buffer)[offset:offset + struct.calcsize(type_code) * count]
+        if sys.byteorder == 'little':
+            column = view.cast(type_code)
+            self._views.extend([view, column])
+            return column
+        column = array(type_code, view.tobytes())
+        column.byteswap()
+        view.release()
+        return column
+
+    def row(self, doc_id):
+        '''
+        gets the row of the doc id in the columns, -1 if the doc id is not in the document store.
+        '''
+        row = bisect_left(self.doc_ids, doc_id)
+        if row == len(self.doc_ids) or self.doc_ids[row] != doc_id:
+            return -1
+        return row
+
+    def get_term(self, term_id):
+        '''
+        gets the term of a term id of the vectors.
+        '''
+        return self._term(term_id)
+
+    def get_normalized_vector_columns(self, row):
+        '''
+        gets the normalized vector of the document at the row, as (term ids, weights) slices of the vector columns.
+        '''
+        start, end = self._vector_offsets[row], self._vector_offsets[row + 1]
+        term_ids, weights = self._vector_term_ids[start:end], self._vector_weights[start:end]
+        if self.normalized:
+            return term_ids, weights
+        length = self.lengths.values[row]
+        return term_ids, [w / length if length else 0 for w in weights]
+
+    def get_normalized_vector(self, row):
+        '''
+        gets the normalized vector of the document at the row, as a dictionary of term -> weight.
+        '''
+        return {self._term(t): w for t, w in zip(*self.get_normalized_vector_columns(row))}
+
+    def get_vector(self, row):
+        '''
+        gets the vector of the document at the row, as a dictionary of term -> weight.
+        the weights of normalized vectors are multiplied back by the document length, within float rounding.
+        '''
+        if not self.normalized:
+            start, end = self._vector_offsets[row], self._vector_offsets[row + 1]
+            return {self._term(self._vector_term_ids[i]): self._vector_weights[i] for i in range(start, end)}
+        length = self.lengths.values[row]
+        return {t: w * length for t, w in self.get_normalized_vector(row).items()}
+
+    def get_data(self, doc_id):
+        '''
+        gets the list of [title, date_posted, court] lists of the document.
+        the data file is loaded the first time data is accessed.
+        '''
+        if self._data is None:
+            with open(document_data_file_name(self.file_name), 'rb') as f:
+                self._data = load(f)
+        return self._data[doc_id]
+
+    def __getitem__(self, doc_id):
+        row = self.row(doc_id)
+        if row < 0:
+            raise KeyError(doc_id)
+        return StoredDocument(self, doc_id, row)
+
+    def __contains__(self, doc_id):
+        return self.row(doc_id) >= 0
+
+    def __iter__(self):
+        return iter(self.doc_ids)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def close(self):
+        '''
+        releases the columns, unmaps the buffer and closes the document store file.
+        '''
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self.buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class StoredDocument(Document):
+    '''
+    read only view of a document in a document store, with the same attributes and methods as a document object.
+    the attributes are read from the document store when they are accessed.
+
+    store -> document store of the document.
+    doc_id -> id of the document.
+    row -> row of the document in the columns of the document store.
+    '''
+
+    def __init__(self, store, doc_id, row):
+        self.store = store
+        self.doc_id = doc_id
+        self.row = row
+
+    @property
+    def length(self):
+        return self.store.lengths.values[self.row]
+
+    @property
+    def vector(self):
+        return self.store.get_vector(self.row)
+
+    @property
+    def data(self):
+        return self.store.get_data(self.doc_id)
+
+    def get_normalized_vector(self):
+        return self.store.get_normalized_vector(self.row)
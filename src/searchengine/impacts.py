@@ -0,0 +1,198 @@
+from array import array
+from tempfile import TemporaryFile
+
+from .lexicon import Lexicon
+from .lexicon import term_ids
+from .postingsfile import PostingsFile
+from .util import tf
+
+import mmap
+import os
+import shutil
+import struct
+import sys
+
+_impacts_magic = b'LCRIMPACTS'
+_impacts_version = 1
+_impacts_header = _impacts_magic + bytes([_impacts_version])
+
+# number of terms, impact segments and postings, after the header.
+_counts = struct.Struct('<QQQ')
+
+# the columns start after the header and counts, padded so every column is aligned to 8 bytes.
+_columns_offset = 40
+
+# number of postings of an impact segment, the postings of a segment are scored together.
+_segment_size = 64
+
+def impacts_file_name(postings_file):
+    '''
+    gets the name of the impact ordered postings file of a postings file.
+    '''
+    return f'{postings_file}.impacts'
+
+def write_impacts(dictionary, postings_file, lengths, file_to_write):
+    '''
+    writes the postings lists of every term of dictionary to file_to_write ordered by impact,
+    the score tf(term_frequency) / length a posting adds to its document for a query weight of 1.
+    the postings of a term are sorted by decreasing impact (then increasing doc id) and split into segments of
+    _segment_size postings, so the segments of a term are in decreasing order of their largest impact.
+    layout, with integers and floats in little endian:
+    header -> magic and version, and the number of terms, segments and postings, padded to _columns_offset.
+    term offsets -> start of the segments of each term, in term id order, and the end of the last term's segments, 8 bytes each.
+    segment starts -> start of the postings of each segment, and the end of the last segment's postings, 8 bytes each.
+    segment bounds -> largest impact of each segment, 8 bytes each.
+    doc ids -> doc ids of the postings, 8 bytes each.
+    impacts -> impacts of the postings, 8 bytes each.
+    returns the dictionary of the number of terms, segments and postings written, to record in the index metadata.
+    only the postings list of one term is held in memory at a time, the columns of the segments and postings are
+    written to temporary files as each term is read, and copied after the term offsets once every term is read.
+    '''
+    ids = term_ids(dictionary)
+    term_offsets = array('Q', [0])
+    segments, size = 0, 0
+    with PostingsFile(postings_file) as f, TemporaryFile() as segment_starts, TemporaryFile() as segment_bounds, \
+            TemporaryFile() as doc_ids, TemporaryFile() as impacts:
+        _write_column(array('Q', [0]), segment_starts)
+        for term in sorted(ids, key=ids.get):
+            postings = [(tf(p.term_frequency) / lengths[p.doc_id], p.doc_id) for p in f.read(dictionary[term].offset)]
+            postings.sort(key=lambda p: (-p[0], p[1]))
+            starts = range(0, len(postings), _segment_size)
+            _write_column(array('Q', [size + min(start + _segment_size, len(postings)) for start in starts]),
+                          segment_starts)
+            _write_column(array('d', [postings[start][0] for start in starts]), segment_bounds)
+            _write_column(array('q', [doc_id for _, doc_id in postings]), doc_ids)
+            _write_column(array('d', [impact for impact, _ in postings]), impacts)
+            segments += len(starts)
+            size += len(postings)
+            term_offsets.append(segments)
+
+        terms = len(ids)
+        with open(file_to_write, 'wb') as out:
+            out.write(_impacts_header)
+            out.write(_counts.pack(terms, segments, size))
+            out.write(bytes(_columns_offset - len(_impacts_header) - _counts.size))
+            _write_column(term_offsets, out)
+            for column in (segment_starts, segment_bounds, doc_ids, impacts):
+                column.seek(0)
+                shutil.copyfileobj(column, out)
+    return {'terms': terms, 'segments': segments, 'postings': size}
+
+def _write_column(values, f):
+    '''
+    writes the array of values to the file in little endian.
+    '''
+    if sys.byteorder != 'little':
+        values.byteswap()
+    values.tofile(f)
+
+def load_impacts(postings_file, dictionary, metadata):
+    '''
+    opens the impact ordered postings written next to the postings file, None if the index has none.
+    the impacts file is only opened if the index metadata records it, and its counts match the recorded counts
+    and the dictionary, so an impacts file left by an earlier index is not read.
+    a stale impacts file is skipped with a warning rather than raising an error, and the index is ranked exhaustively.
+    '''
+    file_name = impacts_file_name(postings_file)
+    counts = metadata.get('impacts')
+    if counts is None or not os.path.exists(file_name):
+        return None
+    impacts = ImpactFile(file_name, dictionary)
+    if impacts.counts() != counts or counts['terms'] != len(dictionary):
+        impacts.close()
+        print(f'skipped impact ordered postings, {file_name} was not written with this index', file=sys.stderr)
+        return None
+    return impacts
+
+class ImpactFile:
+    '''
+    impact ordered postings of the terms of a dictionary, read from a memory mapped impacts file (see write_impacts),
+    for score at a time ranking (see VectorSpaceModel._rank_by_impact).
+
+    file_name -> name of the impacts file.
+    dictionary -> dictionary the impacts file was written with, to get the term ids of terms.
+    buffer -> memory mapped contents of the impacts file.
+    '''
+
+    def __init__(self, file_name, dictionary):
+        self.file_name = file_name
+        self.dictionary = dictionary
+        self._file = open(file_name, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        if self.buffer[:len(_impacts_header)] != _impacts_header:
+            self.close()
+            raise ValueError(f'unsupported impacts file format version: {file_name}')
+        terms, segments, size = _counts.unpack_from(self.buffer, len(_impacts_header))
+        self._size = (terms, segments, size)
+        offset = _columns_offset
+        self._term_offsets = self._column(offset, terms + 1, 'Q')
+        offset += 8 * (terms + 1)
+        self._segment_starts = self._column(offset, segments + 1, 'Q')
+        offset += 8 * (segments + 1)
+        self._segment_bounds = self._column(offset, segments, 'd')
+        offset += 8 * segments
+        self._doc_ids = self._column(offset, size, 'q')
+        offset += 8 * size
+        self._impacts = self._column(offset, size, 'd')
+        if isinstance(dictionary, Lexicon):
+            self._term_id = dictionary.term_id
+        else:
+            ids = term_ids(dictionary)
+            self._term_id = lambda term: ids.get(term, -1)
+
+    def _column(self, offset, count, type_code):
+        '''
+        gets a column of count values of the type code at offset of the buffer.
+        on little endian machines the column is a view of the buffer, otherwise it is copied and byte swapped.
+        '''
+        view = memoryview(self.buffer)[offset:offset + struct.calcsize(type_code) * count]
+        if sys.byteorder == 'little':
+            column = view.cast(type_code)
+            self._views.extend([view, column])
+            return column
+        column = array(type_code, view.tobytes())
+        column.byteswap()
+        view.release()
+        return column
+
+    def counts(self):
+        '''
+        gets the dictionary of the number of terms, segments and postings of the impacts file, like write_impacts.
+        '''
+        terms, segments, size = self._size
+        return {'terms': terms, 'segments': segments, 'postings': size}
+
+    def get_segments(self, term):
+        '''
+        gets the impact segments of the term as a list of (largest impact, segment number) pairs,
+        in decreasing order of their largest impacts. returns an empty list if term is not in the dictionary.
+        '''
+        term_id = self._term_id(term)
+        if term_id < 0:
+            return []
+        start, end = self._term_offsets[term_id], self._term_offsets[term_id + 1]
+        return list(zip(self._segment_bounds[start:end], range(start, end)))
+
+    def read_segment(self, segment):
+        '''
+        gets the postings of the segment number as (doc ids, impacts) slices of the columns.
+        '''
+        start, end = self._segment_starts[segment], self._segment_starts[segment + 1]
+        return self._doc_ids[start:end], self._impacts[start:end]
+
+    def close(self):
+        '''
+        releases the columns, unmaps the buffer and closes the impacts file.
+        '''
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self.buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,327 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from .documentstore import _documents_version
+from .documentstore import document_data_file_name
+from .impacts import impacts_file_name
+from .indexer import Indexer
+from .lexicon import _lexicon_version
+from .postingsfile import _binary_version
+from .postingsfile import binary_format
+from .postingsfile import positions_file_name
+from .segments import Segment
+from .segments import SegmentedDictionary
+from .synonyms import synonyms_file_name
+from .tokenizer import nltk_tokenizer
+from .util import date_to_string
+from .util import load_documents
+from .util import stems_file_name
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+manifest_file = 'manifest.json'
+manifest_version = 2
+stemmer = 'porter'
+
+def manifest_file_name(index_directory):
+    '''
+    gets the name of the manifest file of an index directory.
+    '''
+    return os.path.join(index_directory, manifest_file)
+
+def load_manifest(index_directory):
+    '''
+    loads the manifest of an index directory.
+    the manifest is a json object:
+    version -> version of the manifest format.
+    generation -> number of the manifest, increased every time the manifest is replaced.
+    created -> date the manifest was written, yyyy-mm-dd hh:mm:ss.
+    tokenizer -> name of the tokenizer the documents were tokenized with.
+    stemmer -> name of the stemmer the terms were stemmed with.
+    documents -> number of documents that are not deleted.
+    segments -> list of segments from oldest to newest, each a json object:
+        name -> name of the segment's directory, relative to the index directory.
+        files -> dictionary of file kind -> path of the file, relative to the index directory.
+                 dictionary, postings and documents, and positions, document_data, synonyms, impacts and stems
+                 when they were written.
+        formats -> dictionary of file kind -> format and version of the dictionary, postings and documents files.
+        documents -> number of documents in the segment, including deleted documents.
+        terms -> number of terms in the segment.
+        checksums -> dictionary of file kind -> sha256 digest of the file.
+        deleted -> doc ids of the segment's documents that are deleted, or replaced by a newer segment.
+    manifests of version 1, which had the files of a single index at the top level, are read as a single segment.
+    '''
+    with open(manifest_file_name(index_directory), 'r', encoding='utf8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') == 1:
+        segment = {key: manifest.pop(key) for key in ('files', 'formats', 'terms', 'checksums')}
+        segment['name'] = os.path.dirname(segment['files']['dictionary'])
+        segment['documents'] = manifest['documents']
+        segment['deleted'] = []
+        manifest['segments'] = [segment]
+        manifest['version'] = manifest_version
+    if manifest.get('version') != manifest_version:
+        raise ValueError(f'unsupported manifest version: {manifest_file_name(index_directory)}')
+    if manifest['stemmer'] != stemmer:
+        raise ValueError(f'unsupported stemmer: {manifest["stemmer"]}')
+    return manifest
+
+def segment_files(index_directory, segment):
+    '''
+    gets a dictionary of file kind -> path of the files of a segment of the manifest.
+    '''
+    return {kind: os.path.join(index_directory, name) for kind, name in segment['files'].items()}
+
+def _checksum(file_name):
+    '''
+    gets the sha256 digest of a file.
+    '''
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def verify_index(index_directory, manifest=None):
+    '''
+    checks the files of the segments listed in the manifest of an index directory against their checksums.
+    raises a ValueError if a file does not match its checksum.
+    '''
+    manifest = load_manifest(index_directory) if manifest is None else manifest
+    for segment in manifest['segments']:
+        for kind, file_name in segment_files(index_directory, segment).items():
+            if _checksum(file_name) != segment['checksums'][kind]:
+                raise ValueError(f'checksum mismatch: {file_name}')
+
+@contextmanager
+def _lock_manifest(index_directory, timeout=60):
+    '''
+    holds the lock on the manifest of an index directory while it is read, updated and replaced,
+    so updates from different processes do not overwrite each other.
+    the lock is a file that is created exclusively, if a process is killed while holding it, it has to be removed by hand.
+    '''
+    lock_file = os.path.join(index_directory, '.manifest.lock')
+    deadline = time.monotonic() + timeout
+    while 1:
+        try:
+            os.close(os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'could not lock {lock_file}, remove it if no index is being updated')
+            time.sleep(0.1)
+    try:
+        yield
+    finally:
+        os.remove(lock_file)
+
+def write_manifest(index_directory, segments, tokenizer):
+    '''
+    writes the manifest of an index directory for the given segments, see load_manifest.
+    the generation is one more than the generation of the current manifest.
+    the manifest is written to a temporary file that replaces the current manifest in a single rename,
+    so readers either see the previous index or the new one, never a mix.
+    once the manifest is replaced, the directories of the segments of the previous manifest that are not in the new one
+    are removed. only segments of the previous manifest are removed, so segments being built are never removed.
+    must be called with the manifest locked. returns the manifest.
+    '''
+    try:
+        previous = load_manifest(index_directory)
+        generation = previous['generation'] + 1
+    except (OSError, ValueError):
+        previous = None
+        generation = 1
+    manifest = {
+        'version': manifest_version,
+        'generation': generation,
+        'created': date_to_string(datetime.now()),
+        'tokenizer': tokenizer,
+        'stemmer': stemmer,
+        'documents': sum(s['documents'] - len(s['deleted']) for s in segments),
+        'segments': segments,
+    }
+    fd, temporary_file = tempfile.mkstemp(prefix='.manifest-', dir=index_directory)
+    with os.fdopen(fd, 'w', encoding='utf8') as f:
+        json.dump(manifest, f, indent=2)
+    os.chmod(temporary_file, 0o644) # temporary files are only readable by their owner.
+    os.replace(temporary_file, manifest_file_name(index_directory))
+    print(f'saved manifest of generation {generation} to {manifest_file_name(index_directory)}')
+    if previous is not None:
+        _remove_segments(index_directory, previous['segments'], segments)
+    return manifest
+
+def _remove_segments(index_directory, previous_segments, segments):
+    '''
+    removes the directories of the previous segments that are not in segments, once the manifest no longer lists them.
+    search engines that opened them keep reading their open files, which are only freed once they are closed.
+    only generation directories made by _create_segment are removed.
+    '''
+    names = {segment['name'] for segment in segments}
+    for segment in previous_segments:
+        name = segment['name']
+        if name in names or not name.startswith('generation-') or os.path.basename(name) != name:
+            continue
+        segment_directory = os.path.join(index_directory, name)
+        try:
+            shutil.rmtree(segment_directory)
+            print(f'removed superseded segment {segment_directory}')
+        except OSError as e:
+            print(f'failed to remove superseded segment {segment_directory}: {e}', file=sys.stderr)
+
+def _create_segment(index_directory, postings_format, memory_limit, workers, tokenizer, save_stems, save_impacts=False):
+    '''
+    creates the directory of a new segment inside index_directory, and an indexer that writes to it.
+    every segment has its own directory, so indexes can be built into the same index directory at the same time.
+    returns the name of the segment, the files it will have and the indexer.
+    '''
+    os.makedirs(index_directory, exist_ok=True)
+    segment_directory = tempfile.mkdtemp(prefix='generation-', dir=index_directory)
+    os.chmod(segment_directory, 0o755)
+    name = os.path.basename(segment_directory)
+    files = {
+        'dictionary': os.path.join(name, 'dictionary'),
+        'postings': os.path.join(name, 'postings'),
+        'documents': os.path.join(name, 'documents'),
+        'document_data': os.path.join(name, document_data_file_name('documents')),
+        'synonyms': os.path.join(name, synonyms_file_name('dictionary')),
+    }
+    if postings_format == binary_format:
+        files['positions'] = positions_file_name(files['postings'])
+    if save_stems:
+        files['stems'] = stems_file_name(files['dictionary'])
+    if save_impacts:
+        files['impacts'] = impacts_file_name(files['postings'])
+    paths = {kind: os.path.join(index_directory, file_name) for kind, file_name in files.items()}
+    indexer = Indexer(paths['postings'], paths['dictionary'], paths['documents'], postings_format, memory_limit,
+                      workers, paths.get('stems'), tokenizer, paths.get('impacts'))
+    return name, files, indexer
+
+def _segment_entry(index_directory, name, files, indexer):
+    '''
+    builds the manifest entry of a segment once its indexer has written it.
+    the synonym table is left out of the files if the indexer could not write it.
+    '''
+    postings_format = indexer.postings_format
+    if indexer.synonyms_file is None:
+        files = {kind: file_name for kind, file_name in files.items() if kind != 'synonyms'}
+    return {
+        'name': name,
+        'files': files,
+        'formats': {
+            'dictionary': f'lexicon {_lexicon_version}',
+            'postings': f'binary {_binary_version}' if postings_format == binary_format else postings_format,
+            'documents': f'document store {_documents_version}',
+        },
+        'documents': len(indexer.documents),
+        'terms': len(indexer.dictionary),
+        'checksums': {kind: _checksum(os.path.join(index_directory, file_name)) for kind, file_name in files.items()},
+        'deleted': [],
+    }
+
+def _delete_documents(index_directory, segments, doc_ids):
+    '''
+    adds the doc ids to the deleted doc ids of the segments that have them.
+    '''
+    for segment in segments:
+        documents = load_documents(segment_files(index_directory, segment)['documents'])
+        try:
+            deleted = set(segment['deleted'])
+            deleted.update(doc_id for doc_id in doc_ids if doc_id in documents)
+            segment['deleted'] = sorted(deleted)
+        finally:
+            documents.close()
+
+def build_index(data_file, index_directory, postings_format=binary_format, memory_limit=None, workers=1,
+                tokenizer=nltk_tokenizer, save_stems=False, limit=-1, save_impacts=False):
+    '''
+    indexes the data file into a single new segment of index_directory, then replaces the manifest to point at it,
+    so the index directory only has the new segment.
+    a search server keeps reading the previous segments until the manifest is replaced.
+    the other arguments are the same as for Indexer, save_impacts writes impact ordered postings.
+    returns the manifest.
+    '''
+    name, files, indexer = _create_segment(index_directory, postings_format, memory_limit, workers, tokenizer, save_stems,
+                                           save_impacts)
+    indexer.index(data_file, limit)
+    segment = _segment_entry(index_directory, name, files, indexer)
+    with _lock_manifest(index_directory):
+        return write_manifest(index_directory, [segment], tokenizer)
+
+def add_segment(data_file, index_directory, postings_format=binary_format, memory_limit=None, workers=1,
+                save_stems=False, limit=-1, save_impacts=False):
+    '''
+    indexes the data file into a new segment, and adds it to the segments of index_directory,
+    without rebuilding the existing segments. documents are tokenized with the tokenizer of the index directory.
+    documents of the data file with the doc id of an existing document replace it:
+    the existing document is deleted from its segment.
+    the document vectors of the new segment are weighted with the doc frequencies of all segments,
+    like the doc frequencies a search engine sums over the segments.
+    returns the manifest.
+    '''
+    manifest = load_manifest(index_directory)
+    name, files, indexer = _create_segment(index_directory, postings_format, memory_limit, workers,
+                                           manifest['tokenizer'], save_stems, save_impacts)
+    segments = [Segment(index_directory, segment) for segment in manifest['segments']]
+    try:
+        indexer.collection_dictionary = SegmentedDictionary(segments)
+        indexer.collection_size = sum(segment['documents'] for segment in manifest['segments'])
+        indexer.index(data_file, limit)
+    finally:
+        for segment in segments:
+            segment.close()
+    segment = _segment_entry(index_directory, name, files, indexer)
+    with _lock_manifest(index_directory):
+        manifest = load_manifest(index_directory)
+        segments = manifest['segments']
+        _delete_documents(index_directory, segments, indexer.documents)
+        return write_manifest(index_directory, segments + [segment], manifest['tokenizer'])
+
+def delete_documents(index_directory, doc_ids):
+    '''
+    deletes documents from the segments of index_directory by their doc ids, with tombstones.
+    deleted documents are no longer searched, and are removed from the index files when the segments are merged.
+    returns the manifest.
+    '''
+    with _lock_manifest(index_directory):
+        manifest = load_manifest(index_directory)
+        segments = manifest['segments']
+        _delete_documents(index_directory, segments, set(doc_ids))
+        return write_manifest(index_directory, segments, manifest['tokenizer'])
+
+def merge_segments(index_directory, postings_format=binary_format):
+    '''
+    merges the segments of index_directory into a single segment without deleted documents.
+    the manifest is only locked to replace it, so searching, adding segments and deleting documents
+    can go on while the segments are merged: segments added in the meantime are kept after the merged segment,
+    and documents deleted in the meantime are deleted from the merged segment.
+    the merged segment has impact ordered postings if every merged segment has them.
+    returns the manifest.
+    '''
+    manifest = load_manifest(index_directory)
+    merged = manifest['segments']
+    save_impacts = all('impacts' in segment['files'] for segment in merged)
+    name, files, indexer = _create_segment(index_directory, postings_format, None, 1, manifest['tokenizer'], False,
+                                           save_impacts)
+    segments = [Segment(index_directory, segment) for segment in merged]
+    try:
+        indexer.merge_segments(segments)
+    finally:
+        for segment in segments:
+            segment.close()
+    segment = _segment_entry(index_directory, name, files, indexer)
+    with _lock_manifest(index_directory):
+        current = load_manifest(index_directory)
+        names = [s['name'] for s in current['segments'][:len(merged)]]
+        if names != [s['name'] for s in merged]:
+            raise ValueError(f'segments of {index_directory} were replaced while they were merged')
+        deleted = set()
+        for before, after in zip(merged, current['segments']):
+            deleted.update(set(after['deleted']) - set(before['deleted']))
+        _delete_documents(index_directory, [segment], deleted)
+        return write_manifest(index_directory, [segment] + current['segments'][len(merged):], current['tokenizer'])
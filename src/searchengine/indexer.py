@@ -1,29 +1,154 @@
+from array import array
+from collections import Counter
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from functools import reduce
-
-from nltk import PorterStemmer
-from nltk import sent_tokenize
-from nltk import word_tokenize
+from heapq import heappush
+from heapq import heapreplace
+from heapq import merge
+from itertools import groupby
+from tempfile import TemporaryFile
 
 from .document import Document
+from .documentstore import get_lengths
+from .impacts import write_impacts
 from .postingslist import Posting
 from .postingslist import PostingsList
+from .postingsfile import binary_format
+from .postingsfile import write_postings_file
+from .segments import SegmentedDictionary
+from .segments import SegmentedPostingsFile
+from .synonyms import synonyms_file_name
+from .synonyms import write_synonym_table
 from .term import Term
+from .tokenizer import get_tokenizer
+from .tokenizer import nltk_tokenizer
 from .util import string_to_date
 from .util import tf
 from .util import idf
 from .util import stem
+from .util import stem_cache
 from .util import has_any_alphanumeric
-from .util import get_line_pointers
+from .util import metadata_file_name
+from .util import write_metadata
 from .util import write_dictionary
 from .util import write_documents
 
 import csv
+import io
 import math
 import os
 import pickle
 import sys
 
+# approximate memory taken by a posting and by each of its positions, to keep postings lists within the memory limit.
+_posting_size = 200
+_position_size = 36
+
+# approximate number of bytes of the data file that a worker tokenizes at a time when indexing in parallel.
+_chunk_size = 1 << 24
+
+def _parse_row(row):
+    '''
+    parses a csv row of the data file into a (doc id, title, date_posted, court, content) tuple.
+    '''
+    doc_id, title, content, date_posted, court = row
+    return int(doc_id), title, string_to_date(date_posted), court, content
+
+def tokenize_content(content, tokenizer):
+    '''
+    tokenizes the content of a single document with the tokenizer
+    collects a dictionary of term -> list of positional indexes, starting from 0
+    only words that contain at least one alphanumeric character is stored as a term
+    however, positional indexes, takes into account all words, regardless of whether they are considered terms
+    this is to maintain accurate information on the absolute positions of terms (for a strict phrase query match).
+
+    therefore for the text "a ... b", "a" and "b" are indexed while "..." is not, however, from the positional indexes,
+    "a" and "b" are not adjacent to each other from this given text.
+
+    returns the dictionary and the positional index of the last word (0 if there are no words).
+    '''
+    terms = {}
+    words = tokenizer.tokenize(content)
+    index = 0
+    for index, word in enumerate(words):
+        if has_any_alphanumeric(word):
+            term = stem(word)
+            if term not in terms:
+                terms[term] = []
+            terms[term].append(index)
+    return terms, index
+
+def _index_chunk(data_file, start, end, tokenizer, save_stems=False):
+    '''
+    indexes the documents of the data file from byte start to byte end into partial postings lists,
+    the range must start at a csv record (and end at one, or at the end of the file).
+    returns a tuple of:
+    rows -> list of (doc id, title, date_posted, court, word count, term counts) tuples, one per csv record,
+            where word count is from tokenize_content and term counts is a dictionary of term -> count.
+    postings -> dictionary of term -> list of (doc id, positional indexes) pairs, one per record containing the term,
+                in record order. the length of each list is the term's doc frequency in the chunk.
+                positional indexes of a doc id read earlier in the chunk continue from it, as in Indexer._index_terms,
+                positional indexes of a doc id read in an earlier chunk are shifted when the chunks are merged.
+    stems -> list of (word, stemmed term) pairs the worker's stem cache added while indexing the chunk
+             if save_stems is set (an empty list otherwise), so the stems of every worker can be saved.
+    '''
+    csv.field_size_limit((1 << 31) - 1)
+    with open(data_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf8')
+    cached = set(stem_cache.stems) if save_stems else None
+    rows = []
+    postings = {}
+    word_counts = {} # doc id -> positional index of the last word read under it in the chunk.
+    for row in csv.reader(io.StringIO(data, newline='')):
+        doc_id, title, date_posted, court, content = _parse_row(row)
+        terms, word_count = tokenize_content(content, tokenizer)
+        offset = word_counts.get(doc_id, 0)
+        word_counts[doc_id] = word_count + offset
+        for term, positions in terms.items():
+            if term not in postings:
+                postings[term] = []
+            postings[term].append((doc_id, [p + offset for p in positions] if offset else positions))
+        rows.append((doc_id, title, date_posted, court, word_count, {t: len(p) for t, p in terms.items()}))
+    stems = [(w, t) for w, t in stem_cache.stems.items() if w not in cached] if save_stems else []
+    return rows, postings, stems
+
+def _truncate_chunk(rows, postings, size):
+    '''
+    truncates the rows and partial postings lists of an indexed chunk (see _index_chunk) to its first size rows.
+    each row adds at most one posting to a term's postings list, so the postings of the first size rows are the
+    first postings of each list, as many as the rows that contain the term.
+    '''
+    counts = Counter(term for row in rows[:size] for term in row[-1])
+    return rows[:size], {term: postings[term][:counts[term]] for term in postings if counts[term]}
+
+def _find_chunks(data_file, chunk_size):
+    '''
+    splits the data file after its header row into (start, end) byte ranges of about chunk_size bytes,
+    where every range starts and ends on a csv record boundary.
+    a line ends a record if the number of quotes read so far is even, as quotes within
+    quoted fields are escaped by doubling them.
+    '''
+    chunks = []
+    quotes = 0
+    start = None
+    with open(data_file, 'rb') as f:
+        position = 0
+        for line in f:
+            quotes += line.count(b'"')
+            position += len(line)
+            if quotes % 2:
+                continue
+            if start is None:
+                start = position # end of the header row.
+            elif position - start >= chunk_size:
+                chunks.append((start, position))
+                start = position
+    if start is not None and position > start:
+        chunks.append((start, position))
+    return chunks
+
 class Indexer:
     '''
     indexer class responsible for indexing documents.
@@ -31,16 +156,50 @@ class Indexer:
     postings_file -> file to store postings.
     dictionary_file -> file to store dictionary of terms.
     document_file -> file to store documents' meta data.
+    postings_format -> format of the postings file, text_format or binary_format.
+    memory_limit -> approximate number of bytes of postings lists to keep in memory while indexing.
+                    when the limit is reached, the postings lists are flushed to a sorted run on disk,
+                    and the runs are merged into the postings file at the end of indexing.
+                    None keeps all postings lists in memory.
+    workers -> number of processes to index documents with.
+               with more than one worker, the data file is split into chunks on record boundaries, which are
+               indexed into partial postings lists in parallel, and the partial postings lists are merged
+               in the same order as the data file, so the index is the same as with a single process.
+    tokenizer -> tokenizer to split documents into words with, recorded in the index metadata next to the dictionary file,
+                 so queries are split the same way.
+    stems_file -> file to persist the stem cache to after indexing, so query parsing starts with the stems of the
+                  indexed words. None does not persist it. with more than one worker, words are stemmed by the
+                  worker processes, which send the stems they cache back with each chunk to be persisted.
+    impacts_file -> file to write the postings lists to ordered by impact, for approximate ranking by impact
+                    (see write_impacts). None does not write them.
+    synonyms_file -> file the synonym table is written to (see write_synonym_table),
+                     set to None if it was not written as the wordnet corpus is not installed.
     dictionary -> dictionary of term -> term objects to store information on terms.
     documents -> dictionary of doc_id -> document objects to store meta data and vectors on docs.
+    collection_dictionary -> dictionary of term -> term objects of the index the documents are added to, if they are
+                             indexed into a new segment of an index directory. its doc frequencies and collection_size
+                             are counted in the idf of the document vectors, so they are weighted like the vectors of
+                             the other segments, rather than by the documents of the segment alone.
+    collection_size -> number of documents of the index the documents are added to.
     '''
 
-    def __init__(self, postings_file, dictionary_file, document_file):
+    def __init__(self, postings_file, dictionary_file, document_file, postings_format=binary_format, memory_limit=None, workers=1, stems_file=None, tokenizer=nltk_tokenizer,
+                 impacts_file=None):
         self.postings_file = postings_file
         self.dictionary_file = dictionary_file
         self.document_file = document_file
+        self.postings_format = postings_format
+        self.memory_limit = memory_limit
+        self.workers = workers
+        self.stems_file = stems_file
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.impacts_file = impacts_file
+        self.synonyms_file = synonyms_file_name(dictionary_file)
         self.dictionary = {}
         self.documents = {}
+        self.collection_dictionary = {}
+        self.collection_size = 0
+        self._collection_doc_frequencies = {}
 
     def _generate_documents(self, data_file):
         '''
@@ -51,10 +210,37 @@ class Indexer:
         with open(data_file, newline='', encoding='utf8') as f:
             data = csv.reader(f)
             next(data)
-            for doc_id, title, content, date_posted, court in data:
-                doc_id = int(doc_id)
-                date_posted = string_to_date(date_posted)
-                yield doc_id, title, date_posted, court, content
+            for row in data:
+                yield _parse_row(row)
+
+    def _tokenize_documents(self, data_file):
+        '''
+        generator for yielding (doc id, title, date_posted, court, terms, word count) tuples,
+        where terms and word count are from tokenize_content.
+        '''
+        for doc_id, title, date_posted, court, content in self._generate_documents(data_file):
+            yield (doc_id, title, date_posted, court) + tokenize_content(content, self.tokenizer)
+
+    def _index_chunks_in_parallel(self, data_file):
+        '''
+        generator for yielding the (rows, postings) of the chunks of the data file (see _index_chunk),
+        indexed on a pool of worker processes. chunks are yielded in the same order as the data file, and only a few
+        chunks per worker are submitted ahead, so indexed chunks do not pile up in memory.
+        the stems cached by the workers are added to stem_cache as their chunks are yielded.
+        '''
+        pending = deque()
+        save_stems = self.stems_file is not None
+        with ProcessPoolExecutor(self.workers) as executor:
+            for start, end in _find_chunks(data_file, _chunk_size):
+                pending.append(executor.submit(_index_chunk, data_file, start, end, self.tokenizer, save_stems))
+                if len(pending) > 2 * self.workers:
+                    rows, postings, stems = pending.popleft().result()
+                    stem_cache.update(stems)
+                    yield rows, postings
+            while pending:
+                rows, postings, stems = pending.popleft().result()
+                stem_cache.update(stems)
+                yield rows, postings
 
     def count_documents(self, data_file):
         '''
@@ -68,106 +254,354 @@ class Indexer:
 
     def _index_content(self, content, offset):
         '''
-        indexes the content of a single document
-        collects a dictionary of term -> list of positional indexes
-        only words that contain at least one alphanumeric character is stored as a term
-        however, positional indexes, takes into account all words, regardless of whether they are considered terms
-        this is to maintain accurate information on the absolute positions of terms (for a strict phrase query match).
-
-        therefore for the text "a ... b", "a" and "b" are indexed while "..." is not, however, from the positional indexes,
-        "a" and "b" are not adjacent to each other from this given text.
+        indexes the content of a single document, see tokenize_content.
+        positional indexes start from offset.
         '''
-        terms = {}
-        words = word_tokenize(content)
+        return self._index_terms(*tokenize_content(content, self.tokenizer), offset)
 
-        if not len(words):
-            return terms, offset
-
-        for index, word in enumerate(words):
-            if has_any_alphanumeric(word):
-                term = stem(word)
-                if term not in terms:
-                    terms[term] = []
-                terms[term].append(index + offset)
+    def _index_terms(self, terms, word_count, offset):
+        '''
+        indexes the terms of a single tokenized document, from tokenize_content.
+        adds the terms to the dictionary, and shifts their positional indexes by offset.
+        the offset allows positional indexes to continue from content read earlier under the same doc id.
+        returns the shifted terms and the positional index of the last word.
+        '''
+        if offset:
+            terms = {term: [p + offset for p in positions] for term, positions in terms.items()}
         for term in terms:
             if term not in self.dictionary:
-                self.dictionary[term] = Term()
-            self.dictionary[term].line = len(self.dictionary)
+                self.dictionary[term] = Term(line=len(self.dictionary))
             self.dictionary[term].doc_frequency += 1
 
-        return terms, index + offset
+        return terms, word_count + offset
 
-    def _build_doc_vector(self, content, k=20):
+    def _write_term_counts(self, f, doc_id, term_counts):
+        '''
+        writes the dictionary of term -> count of a single document's content to f, to build its vector
+        once document frequencies are final, without tokenizing the content again.
+        terms are written as their line (the term's id), in the order they occur in the content.
+        layout: doc_id and number of terms, then the terms' lines, then the terms' counts.
+        '''
+        array('q', [doc_id, len(term_counts)]).tofile(f)
+        array('i', [self.dictionary[t].line for t in term_counts]).tofile(f)
+        array('i', term_counts.values()).tofile(f)
+
+    def _read_term_counts(self, f):
+        '''
+        generator for yielding (doc_id, dictionary of term -> count) pairs written with _write_term_counts.
+        '''
+        terms = list(self.dictionary) # terms in order of their lines.
+        while 1:
+            header = array('q')
+            try:
+                header.fromfile(f, 2)
+            except EOFError:
+                return
+            doc_id, size = header
+            lines, counts = array('i'), array('i')
+            lines.fromfile(f, size)
+            counts.fromfile(f, size)
+            yield doc_id, {terms[line]: count for line, count in zip(lines, counts)}
+
+    def _build_doc_vector(self, term_counts, k=20):
         '''
         builds a vector where terms are the axes of the vector.
+        term_counts is a dictionary of term -> count of the terms that the doc's content contains.
         k denotes the top k terms to be stored as the vector, (measured by tf-idf weighting)
         this vector is to contain the top k weighted terms that the doc's content contains.
         '''
-        terms = [stem(w) for w in word_tokenize(content) if has_any_alphanumeric(w)]
         term_weights = {}
-        for term in terms:
-            if term not in term_weights:
-                term_weights[term] = 0
-            term_weights[term] += 1
-        for term, freq in term_weights.items():
-            term_weights[term] = tf(freq) * idf(len(self.documents), self.dictionary[term].doc_frequency)
+        size = len(self.documents) + self.collection_size
+        for term, freq in term_counts.items():
+            term_weights[term] = tf(freq) * idf(size, self._get_doc_frequency(term))
         
         top_k_terms = sorted(term_weights, key=lambda k: term_weights[k], reverse=True)[:k]
         vector = {t: term_weights[t] for t in top_k_terms}
         return vector
 
-    def _write_to_postings_file(self, postings_lists):
+    def _get_doc_frequency(self, term):
+        '''
+        gets the doc frequency of a term over the indexed documents and the collection they are added to.
+        doc frequencies of the collection are cached, as its dictionary may be read from disk.
+        '''
+        doc_frequency = self.dictionary[term].doc_frequency
+        if not self.collection_size:
+            return doc_frequency
+        if term not in self._collection_doc_frequencies:
+            collection_term = self.collection_dictionary.get(term)
+            self._collection_doc_frequencies[term] = 0 if collection_term is None else collection_term.doc_frequency
+        return doc_frequency + self._collection_doc_frequencies[term]
+
+    def _get_max_score(self, postings_list):
+        '''
+        gets the max_score of a term, the largest tf(term frequency) / document length
+        over the documents in the term's postings list.
+        multiplied by a query weight, it bounds the score any document can get from the term,
+        which allows documents to be skipped when ranking the top k documents.
+        postings with the same doc_id are summed, as they are when documents are ranked.
+        '''
+        weights = {}
+        for posting in postings_list:
+            if posting.doc_id not in weights:
+                weights[posting.doc_id] = 0
+            weights[posting.doc_id] += tf(posting.term_frequency)
+        lengths = [(w, self.documents[doc_id].length) for doc_id, w in weights.items()]
+        return max([w / length for w, length in lengths if length], default=0)
+
+    def _flush_run(self, postings_lists, runs):
+        '''
+        writes the postings lists to a new run, a temporary file of (term, doc stream, positions stream)
+        records sorted by term, where the streams are the encoded postings list.
+        the run is added to runs, and postings_lists is emptied.
+        '''
+        run = TemporaryFile()
+        for term in sorted(postings_lists):
+            pickle.dump((term,) + postings_lists[term].encode(), run)
+        run.seek(0)
+        runs.append(run)
+        postings_lists.clear()
+
+    def _read_run(self, run):
         '''
-        writes postings lists to file
-        each line denotes a postings list
+        generator for yielding the (term, postings list) pairs of a run in term order.
         '''
-        with open(self.postings_file, 'a+', encoding='utf8') as f:
-            f.seek(0)
-            for term, postings_list in postings_lists.items():
-                f.write(str(postings_list.compress()) + '\n')
+        while 1:
+            try:
+                term, doc_stream, positions_stream = pickle.load(run)
+            except EOFError:
+                return
+            yield term, PostingsList.decode(doc_stream, 0, positions_stream)
+
+    def _merge_runs(self, runs):
+        '''
+        k-way merges the runs, generating (term, postings list) pairs in term order.
+        postings lists of the same term are concatenated in the order of the runs,
+        which is the order the documents were read in.
+        only one postings list per run is in memory at a time.
+        '''
+        merged_runs = merge(*[self._read_run(run) for run in runs], key=lambda x: x[0])
+        for term, group in groupby(merged_runs, key=lambda x: x[0]):
+            postings = []
+            for _, postings_list in group:
+                postings.extend(postings_list.postings)
+            yield term, PostingsList(postings)
+
+    def _write_to_postings_file(self, term_postings_lists):
+        '''
+        writes (term, postings list) pairs to file in the indexer's postings format.
+        document lengths must be final, as the max_score of each term is set while the postings lists are written.
+        the offsets of the terms are updated to point to their postings lists in the file.
+        '''
+        terms = []
+        def postings_lists():
+            for term, postings_list in term_postings_lists:
+                self.dictionary[term].max_score = self._get_max_score(postings_list)
+                terms.append(self.dictionary[term])
+                yield postings_list
+        pointers = write_postings_file(postings_lists(), self.postings_file, self.postings_format)
+        for term, pointer in zip(terms, pointers):
+            term.offset = pointer # update pointer for efficient disk read of terms' postings lists.
+            del term.line # remove line attribute, not necessary after indexing.
 
     def index(self, data_file, limit=-1):
         '''
         indexes documents in the data file.
         builds dictionary of terms
         builds a collection of document objects (contains meta data)
+        the data file is read and tokenized once, the term counts of each document are kept in a
+        temporary file until document frequencies are final, to build the document vectors.
+        postings lists are flushed to sorted runs whenever they exceed the memory limit (SPIMI),
+        the runs are merged into the postings file once all documents are read.
+        with more than one worker, chunks of the data file are indexed in parallel and merged in order,
+        and postings lists are only flushed between chunks.
+        limit is the number of csv records to index, -1 indexes them all.
         '''
         postings_lists = {}
-        for index, data in enumerate(self._generate_documents(data_file)):
+        runs = []
+        with TemporaryFile() as term_counts_file:
+            if self.workers > 1:
+                self._index_chunks(data_file, limit, postings_lists, runs, term_counts_file)
+            else:
+                self._index_documents(data_file, limit, postings_lists, runs, term_counts_file)
+
+            term_counts_file.seek(0)
+            for doc_id, term_counts in self._read_term_counts(term_counts_file):
+                doc = self.documents[doc_id]
+                doc.update_vector(self._build_doc_vector(term_counts)) # update document vectors and length
+
+        if runs:
+            self._flush_run(postings_lists, runs)
+            try:
+                self._write_to_postings_file(self._merge_runs(runs))
+            finally:
+                for run in runs:
+                    run.close()
+        else:
+            self._write_to_postings_file(postings_lists.items())
+        print(f'saved postings lists to {self.postings_file}')
+        self._write_index_files()
+
+    def _index_documents(self, data_file, limit, postings_lists, runs, term_counts_file):
+        '''
+        indexes the documents of the data file one at a time into postings_lists, see index.
+        '''
+        postings_size = 0
+        for index, data in enumerate(self._tokenize_documents(data_file)):
             if index == limit:
                 break
-            doc_id, title, date_posted, court, content = data
+            doc_id, title, date_posted, court, terms, word_count = data
             if doc_id not in self.documents:
                 self.documents[doc_id] = Document()
             doc = self.documents[doc_id]
             doc.add(title, date_posted, court)
-            term_positions, word_count = self._index_content(content, doc.word_count)
+            term_positions, word_count = self._index_terms(terms, word_count, doc.word_count)
             doc.word_count = word_count
             for term, positions in term_positions.items():
                 term_frequency = len(positions)
                 if term not in postings_lists:
                     postings_lists[term] = PostingsList()
                 postings_lists[term].add(Posting(doc_id, term_frequency, positions))
+                postings_size += _posting_size + _position_size * term_frequency
+            self._write_term_counts(term_counts_file, doc_id, {t: len(p) for t, p in term_positions.items()})
+            if self.memory_limit is not None and postings_size > self.memory_limit:
+                self._flush_run(postings_lists, runs)
+                postings_size = 0
 
-        self._write_to_postings_file(postings_lists)
-        pointers = get_line_pointers(self.postings_file)
-        for term, pointer in zip(self.dictionary.values(), pointers):
-            term.offset = pointer # update pointer for efficient disk read of terms' postings lists.
-            del term.line # remove line attribute, not necessary after indexing.
-        print(f'saved postings lists to {self.postings_file}')
-
-        for index, data in enumerate(self._generate_documents(data_file)):
-            if index == limit:
+    def _index_chunks(self, data_file, limit, postings_lists, runs, term_counts_file):
+        '''
+        merges the partial postings lists of the chunks of the data file, indexed in parallel, into postings_lists,
+        see index. the doc frequencies of the chunks are added to the dictionary, and positional indexes of doc ids
+        that continue from earlier chunks are shifted by the positional index of their last word in those chunks.
+        '''
+        postings_size = 0
+        indexed = 0
+        for rows, postings in self._index_chunks_in_parallel(data_file):
+            if limit >= 0 and indexed + len(rows) > limit:
+                rows, postings = _truncate_chunk(rows, postings, limit - indexed)
+            indexed += len(rows)
+            offsets = {} # doc id -> positional index of its last word before the chunk.
+            for doc_id, title, date_posted, court, word_count, _ in rows:
+                if doc_id not in self.documents:
+                    self.documents[doc_id] = Document()
+                doc = self.documents[doc_id]
+                doc.add(title, date_posted, court)
+                if doc_id not in offsets:
+                    offsets[doc_id] = doc.word_count
+                doc.word_count += word_count
+            for term, term_postings in postings.items():
+                if term not in self.dictionary:
+                    self.dictionary[term] = Term(line=len(self.dictionary))
+                if term not in postings_lists:
+                    postings_lists[term] = PostingsList()
+                self.dictionary[term].doc_frequency += len(term_postings)
+                postings_list = postings_lists[term]
+                for doc_id, positions in term_postings:
+                    offset = offsets[doc_id]
+                    if offset:
+                        positions = [p + offset for p in positions]
+                    postings_list.add(Posting(doc_id, len(positions), positions))
+                    postings_size += _posting_size + _position_size * len(positions)
+            for doc_id, _, _, _, _, term_counts in rows:
+                self._write_term_counts(term_counts_file, doc_id, term_counts)
+            if self.memory_limit is not None and postings_size > self.memory_limit:
+                self._flush_run(postings_lists, runs)
+                postings_size = 0
+            if indexed == limit:
                 break
-            doc_id, title, date_posted, court, content = data
-            doc = self.documents[doc_id]
-            doc.update_vector(self._build_doc_vector(content)) # update document vectors and length
 
+    def _write_index_files(self):
+        '''
+        writes the dictionary, documents, index metadata, synonym table, impact ordered postings and stem cache
+        once the postings file is written. the index metadata is written before the optional files,
+        so an index is read with the right tokenizer even if writing them fails.
+        '''
         for doc in self.documents.values():
             del doc.word_count # remove word_count attribute, not necessary after indexing.
 
         write_dictionary(self.dictionary, self.dictionary_file)
         print(f'saved dictionary to {self.dictionary_file}')
-        write_documents(self.documents, self.document_file)
+        write_documents(self.documents, self.document_file, self.dictionary)
         print(f'saved documents to {self.document_file}')
+        metadata_file = metadata_file_name(self.dictionary_file)
+        metadata = {'tokenizer': self.tokenizer.name}
+        write_metadata(metadata, metadata_file)
+        print(f'saved index metadata to {metadata_file}')
+        self._write_synonym_table()
+        if self.impacts_file is not None:
+            # recorded once the impacts file is written, so a partly written impacts file is not read.
+            metadata['impacts'] = write_impacts(self.dictionary, self.postings_file, get_lengths(self.documents),
+                                                self.impacts_file)
+            write_metadata(metadata, metadata_file)
+            print(f'saved impact ordered postings to {self.impacts_file}')
+        print(f'stem cache: {stem_cache}')
+        if self.stems_file is not None:
+            stem_cache.save(self.stems_file)
+            print(f'saved stem cache to {self.stems_file}')
         
+
+    def _write_synonym_table(self):
+        '''
+        writes the synonym table of the dictionary next to the dictionary file.
+        the table is skipped if the wordnet corpus is not installed, and a synonym table left by an earlier index
+        in its place is removed, so searching looks synonyms up in wordnet instead.
+        '''
+        try:
+            write_synonym_table(self.dictionary, self.synonyms_file)
+            print(f'saved synonym table to {self.synonyms_file}')
+        except LookupError:
+            print('skipped synonym table, the wordnet corpus is not installed', file=sys.stderr)
+            if os.path.exists(self.synonyms_file):
+                os.remove(self.synonyms_file)
+            self.synonyms_file = None
+
+    def _read_segments(self, segments):
+        '''
+        generator for yielding the (term, postings list) pairs of index segments in term order,
+        where the postings lists of a term in the segments are merged in doc id order, without deleted documents.
+        '''
+        dictionary = SegmentedDictionary(segments)
+        postings_file = SegmentedPostingsFile(segments)
+        for term in dictionary:
+            yield term, postings_file.read(dictionary[term].offset)
+
+    def merge_segments(self, segments, k=20):
+        '''
+        indexes the documents of index segments that are not deleted, instead of a data file,
+        compacting the segments into a single index.
+        documents keep their titles, dates and courts, and their postings lists are copied with their positions.
+        document frequencies, document vectors and max scores are computed over the merged documents,
+        as if they were indexed together, except for documents with several rows in the data file:
+        the vector of a document is built from its total term counts, rather than summed over the vectors of its rows.
+        the segments are read twice, once to build the document vectors, and once to write the postings lists.
+        '''
+        for segment in segments:
+            for doc_id in segment.live_doc_ids():
+                self.documents[doc_id] = Document(segment.documents[doc_id].data)
+
+        # min heaps of the top k (weight, -first position, term) of each document, ties between weights are broken by
+        # the first position of the terms, like the vectors of an index built from a data file.
+        top_weights = {doc_id: [] for doc_id in self.documents}
+        for term, postings_list in self._read_segments(segments):
+            term_counts = {}
+            first_positions = {}
+            for posting in postings_list:
+                term_counts[posting.doc_id] = term_counts.get(posting.doc_id, 0) + posting.term_frequency
+                if posting.doc_id not in first_positions:
+                    first_positions[posting.doc_id] = posting.positions[0] if posting.positions else 0
+            if not term_counts:
+                continue # every document of the term is deleted.
+            self.dictionary[term] = Term(doc_frequency=len(postings_list), line=len(self.dictionary))
+            term_idf = idf(len(self.documents), len(postings_list))
+            for doc_id, count in term_counts.items():
+                entry = (tf(count) * term_idf, -first_positions[doc_id], term)
+                weights = top_weights[doc_id]
+                if len(weights) < k:
+                    heappush(weights, entry)
+                elif entry > weights[0]:
+                    heapreplace(weights, entry)
+        for doc_id, weights in top_weights.items():
+            self.documents[doc_id].update_vector({term: weight for weight, _, term in sorted(weights, reverse=True)})
+
+        self._write_to_postings_file((t, p) for t, p in self._read_segments(segments) if t in self.dictionary)
+        print(f'saved postings lists to {self.postings_file}')
+        self._write_index_files()
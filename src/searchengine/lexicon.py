@@ -0,0 +1,227 @@
+from collections.abc import Mapping
+
+from .term import Term
+from .util import vbyte_encode
+from .util import vbyte_decode
+
+import math
+import mmap
+import os
+import struct
+
+_lexicon_magic = b'LCRLEXICON'
+_lexicon_version = 1
+_lexicon_header = _lexicon_magic + bytes([_lexicon_version])
+
+# number of terms and number of blocks, after the header.
+_counts = struct.Struct('<QQ')
+
+# number of terms in a front coded block, only the first term of a block is stored in full.
+_block_size = 16
+
+def is_lexicon_file(file_name):
+    '''
+    checks if file_name is a lexicon file, from its header.
+    '''
+    with open(file_name, 'rb') as f:
+        return f.read(len(_lexicon_magic)) == _lexicon_magic
+
+def term_ids(dictionary):
+    '''
+    gets a dictionary of term -> term id for the terms of dictionary,
+    where the id of a term is its position in a lexicon written from dictionary.
+    '''
+    return {term: i for i, term in enumerate(sorted(dictionary, key=lambda t: t.encode('utf8')))}
+
+def write_lexicon(dictionary, file_to_write):
+    '''
+    writes a dictionary of term -> term objects to file_to_write as a lexicon.
+    layout, with integers and floats in little endian:
+    header -> magic and version.
+    counts -> number of terms, number of blocks.
+    block offsets -> offset of each block from the start of the blocks, 8 bytes each.
+    doc frequencies, offsets, max scores -> 8 bytes per term, in sorted term order.
+                                            max score is nan for terms without one.
+    blocks -> terms sorted by their utf8 bytes, front coded in blocks of _block_size terms.
+              the first term of a block is its length and bytes, every other term is the length of the
+              prefix it shares with the previous term, the length of the rest, and the rest of its bytes.
+    '''
+    keys = sorted(term.encode('utf8') for term in dictionary)
+    terms = [dictionary[key.decode('utf8')] for key in keys]
+    block_offsets = []
+    blocks = bytearray()
+    previous = b''
+    for i, key in enumerate(keys):
+        if i % _block_size == 0:
+            block_offsets.append(len(blocks))
+            blocks += vbyte_encode([len(key)]) + key
+        else:
+            prefix = len(os.path.commonprefix([previous, key]))
+            blocks += vbyte_encode([prefix, len(key) - prefix]) + key[prefix:]
+        previous = key
+
+    size = len(keys)
+    with open(file_to_write, 'wb') as f:
+        f.write(_lexicon_header)
+        f.write(_counts.pack(size, len(block_offsets)))
+        f.write(struct.pack(f'<{len(block_offsets)}Q', *block_offsets))
+        f.write(struct.pack(f'<{size}Q', *[t.doc_frequency for t in terms]))
+        f.write(struct.pack(f'<{size}q', *[t.offset for t in terms]))
+        f.write(struct.pack(f'<{size}d', *[getattr(t, 'max_score', math.nan) for t in terms]))
+        f.write(blocks)
+
+class Lexicon(Mapping):
+    '''
+    read only dictionary of term -> term objects, read from a memory mapped lexicon file (see write_lexicon).
+    nothing is loaded when it is opened, terms are binary searched over the first terms of the blocks,
+    then found by decoding a single block, and term objects are built from the arrays when they are looked up.
+    searching uses get, which looks a term up once, rather than checking if the term is in the lexicon first.
+    a term's id is its position in sorted order.
+
+    file_name -> name of the lexicon file.
+    buffer -> memory mapped contents of the lexicon file.
+    size -> number of terms.
+    block_count -> number of front coded blocks.
+    '''
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._file = open(file_name, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(_lexicon_header)] != _lexicon_header:
+            self.close()
+            raise ValueError(f'unsupported lexicon format version: {file_name}')
+        self.size, self.block_count = _counts.unpack_from(self.buffer, len(_lexicon_header))
+        self._block_offsets = len(_lexicon_header) + _counts.size
+        self._doc_frequencies = self._block_offsets + 8 * self.block_count
+        self._offsets = self._doc_frequencies + 8 * self.size
+        self._max_scores = self._offsets + 8 * self.size
+        self._blocks = self._max_scores + 8 * self.size
+
+    def _block_offset(self, block):
+        '''
+        gets the offset of the block in the buffer.
+        '''
+        return self._blocks + struct.unpack_from('<Q', self.buffer, self._block_offsets + 8 * block)[0]
+
+    def _first_key(self, block):
+        '''
+        gets the utf8 bytes of the first term of the block.
+        '''
+        (length,), offset = vbyte_decode(self.buffer, self._block_offset(block), 1)
+        return self.buffer[offset:offset + length]
+
+    def _decode_block(self, block):
+        '''
+        generates the utf8 bytes of the terms of the block, in sorted order.
+        '''
+        offset = self._block_offset(block)
+        (length,), offset = vbyte_decode(self.buffer, offset, 1)
+        key = self.buffer[offset:offset + length]
+        offset += length
+        yield key
+        for _ in range(min(_block_size, self.size - block * _block_size) - 1):
+            (prefix, length), offset = vbyte_decode(self.buffer, offset, 2)
+            key = key[:prefix] + self.buffer[offset:offset + length]
+            offset += length
+            yield key
+
+    def term_id(self, term):
+        '''
+        gets the id of the term, -1 if the term is not in the lexicon.
+        '''
+        key = term.encode('utf8')
+        low, high = 0, self.block_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._first_key(middle) <= key:
+                low = middle + 1
+            else:
+                high = middle
+        block = low - 1
+        if block < 0:
+            return -1
+        for i, block_key in enumerate(self._decode_block(block)):
+            if block_key == key:
+                return block * _block_size + i
+            if block_key > key:
+                break
+        return -1
+
+    def term(self, term_id):
+        '''
+        gets the term with the given id.
+        '''
+        if not 0 <= term_id < self.size:
+            raise IndexError(f'term id out of range: {term_id}')
+        block, i = divmod(term_id, _block_size)
+        for j, key in enumerate(self._decode_block(block)):
+            if j == i:
+                return key.decode('utf8')
+
+    def get_term(self, term_id):
+        '''
+        builds the term object of the term with the given id.
+        terms written without a max score have no max_score attribute, like the dictionaries they were written from.
+        '''
+        doc_frequency, = struct.unpack_from('<Q', self.buffer, self._doc_frequencies + 8 * term_id)
+        offset, = struct.unpack_from('<q', self.buffer, self._offsets + 8 * term_id)
+        max_score, = struct.unpack_from('<d', self.buffer, self._max_scores + 8 * term_id)
+        term = Term(doc_frequency, offset=offset, max_score=max_score)
+        del term.line
+        if math.isnan(max_score):
+            del term.max_score
+        return term
+
+    def __getitem__(self, term):
+        term_id = self.term_id(term) if isinstance(term, str) else -1
+        if term_id < 0:
+            raise KeyError(term)
+        return self.get_term(term_id)
+
+    def __contains__(self, term):
+        return isinstance(term, str) and self.term_id(term) >= 0
+
+    def get(self, term, default=None):
+        '''
+        gets the term object of the term, or default if it is not in the lexicon.
+        the term is looked up once, where checking `term in lexicon` before `lexicon[term]` looks it up twice.
+        '''
+        term_id = self.term_id(term) if isinstance(term, str) else -1
+        return default if term_id < 0 else self.get_term(term_id)
+
+    def __iter__(self):
+        for block in range(self.block_count):
+            for key in self._decode_block(block):
+                yield key.decode('utf8')
+
+    def __len__(self):
+        return self.size
+
+    def items(self):
+        '''
+        generates (term, term object) pairs in sorted term order, decoding each block once.
+        '''
+        for term_id, term in enumerate(self):
+            yield term, self.get_term(term_id)
+
+    def values(self):
+        '''
+        generates term objects in sorted term order.
+        '''
+        for term_id in range(self.size):
+            yield self.get_term(term_id)
+
+    def close(self):
+        '''
+        unmaps the buffer and closes the lexicon file.
+        '''
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
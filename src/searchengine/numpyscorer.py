@@ -0,0 +1,125 @@
+from .documentstore import Column
+from .documentstore import get_lengths
+from .postingsfile import binary_format
+from .util import vbyte_decode
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def vbyte_decode_array(buffer, offset, count):
+    '''
+    decodes count variable byte encoded integers from buffer, starting at offset, into an int64 array.
+    same as util.vbyte_decode, but vectorised: the last byte of each number is found from the high bits,
+    then the 7 bit groups of every number are shifted and summed at once.
+    '''
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    # a number takes at most 10 bytes, the slice is copied so the buffer is not exported.
+    data = np.frombuffer(buffer[offset:offset + 10 * count], dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)[:count]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    data = data[:ends[-1] + 1]
+    group_starts = np.repeat(starts, ends - starts + 1)
+    shifts = 7 * (np.arange(len(data)) - group_starts)
+    return np.add.reduceat((data & 0x7f).astype(np.int64) << shifts, starts)
+
+def read_postings_arrays(postings_file, offset):
+    '''
+    reads the postings list at offset of postings_file into (doc_ids, term_frequencies) int32 arrays.
+    binary postings are decoded straight from the mapped buffer, text postings are parsed first.
+    '''
+    if postings_file.format != binary_format:
+        postings_list = postings_file.read(offset)
+        doc_ids = np.array([p.doc_id for p in postings_list], dtype=np.int32)
+        term_frequencies = np.array([p.term_frequency for p in postings_list], dtype=np.int32)
+        return doc_ids, term_frequencies
+    (size, _, skip_table_length), offset = vbyte_decode(postings_file.buffer, offset, 3)
+    values = vbyte_decode_array(postings_file.buffer, offset + skip_table_length, 3 * size).reshape(size, 3)
+    doc_ids = np.cumsum(values[:, 0]).astype(np.int32)
+    return doc_ids, values[:, 1].astype(np.int32)
+
+class NumpyScorer:
+    '''
+    cosine scoring for the vector space model with numpy arrays.
+    documents are numbered densely by their position in the sorted doc_ids array,
+    scores are accumulated into a dense array indexed by that number,
+    and normalised with a single divide by the precomputed document lengths.
+    ranks documents the same as VectorSpaceModel._rank, within float tolerance.
+
+    dictionary -> dictionary of term -> term objects
+    postings_file -> postings file object to read postings lists from
+    doc_ids -> sorted array of doc ids, a document's dense number is its index in this array.
+    lengths -> lengths of the documents, indexed by dense number.
+    the arrays are views of the columns of a document store, so the scorer must be closed before the document store.
+    '''
+
+    def __init__(self, dictionary, documents, postings_file):
+        if np is None:
+            raise ImportError('numpy is required to score with numpy')
+        self.dictionary = dictionary
+        self.postings_file = postings_file
+        lengths = get_lengths(documents)
+        if isinstance(lengths, Column):
+            # the sorted doc ids and lengths columns of a document store are used in place.
+            self.doc_ids = np.frombuffer(lengths.doc_ids, dtype=np.int64)
+            self.lengths = np.frombuffer(lengths.values, dtype=np.float64)
+        else:
+            self.doc_ids = np.array(sorted(lengths), dtype=np.int64)
+            self.lengths = np.array([lengths[d] for d in self.doc_ids.tolist()], dtype=np.float64)
+
+    def close(self):
+        '''
+        drops the arrays, so the columns of a document store they view can be released.
+        '''
+        self.doc_ids = None
+        self.lengths = None
+
+    def _get_postings_arrays(self, offset):
+        '''
+        gets the postings of the postings list at offset as (dense doc numbers, tf weights) arrays.
+        the arrays are kept in the cache of the postings file, next to its decoded postings lists.
+        '''
+        key = ('numpy', offset)
+        arrays = self.postings_file.cache.get(key)
+        if arrays is None:
+            doc_ids, term_frequencies = read_postings_arrays(self.postings_file, offset)
+            weights = (1 + np.log10(term_frequencies, dtype=np.float32)).astype(np.float32)
+            arrays = np.searchsorted(self.doc_ids, doc_ids), weights
+            self.postings_file.cache.put(key, arrays, arrays[0].nbytes + arrays[1].nbytes)
+        return arrays
+
+    def rank(self, query_vector, relevant_doc_ids, k=None):
+        '''
+        ranks doc ids with the given query vector using cosine scoring.
+        relevant doc ids are ranked at the top regardless of score.
+        documents with the same score are ranked in increasing doc id order.
+        if k is given, only the top k doc ids are returned, selected with argpartition.
+        '''
+        scores = np.zeros(len(self.doc_ids), dtype=np.float64)
+        matched = np.zeros(len(self.doc_ids), dtype=bool)
+        for term, query_weight in query_vector.items():
+            entry = self.dictionary.get(term)
+            if entry is None:
+                continue
+            docs, weights = self._get_postings_arrays(entry.offset)
+            np.add.at(scores, docs, weights * query_weight) # doc ids can repeat within a postings list.
+            matched[docs] = True
+        candidates = np.flatnonzero(matched)
+        scores[candidates] /= self.lengths[candidates]
+
+        output = [doc_id for doc_id in relevant_doc_ids][:k]
+        if relevant_doc_ids:
+            candidates = candidates[~np.isin(self.doc_ids[candidates], relevant_doc_ids)]
+
+        size = len(candidates) if k is None else max(0, min(k - len(output), len(candidates)))
+        if size == 0:
+            return output
+        if size < len(candidates):
+            top = np.argpartition(-scores[candidates], size - 1)[:size]
+            # keep every candidate tied with the kth best score, so ties are broken by doc id below.
+            candidates = candidates[scores[candidates] >= scores[candidates[top]].min()]
+        order = np.lexsort((self.doc_ids[candidates], -scores[candidates]))[:size]
+        output.extend(self.doc_ids[candidates[order]].tolist())
+        return output
@@ -0,0 +1,256 @@
+from collections import OrderedDict
+
+from .postingslist import BlockPostingsCursor
+from .postingslist import PostingsCursor
+from .postingslist import PostingsList
+
+import mmap
+import os
+
+text_format = 'text'
+binary_format = 'binary'
+postings_formats = (text_format, binary_format)
+_binary_magic = b'LCRPOSTINGS'
+_binary_version = 3
+_binary_header = _binary_magic + bytes([_binary_version])
+
+# approximate number of bytes a decoded posting and each of its positions take in memory.
+_posting_bytes = 240
+_position_bytes = 8
+
+def positions_file_name(postings_file):
+    '''
+    gets the name of the positions file that belongs to a binary postings file.
+    '''
+    return f'{postings_file}.positions'
+
+def _map_file(f):
+    '''
+    memory maps an open file for reading.
+    an empty file cannot be memory mapped, so it is represented with an empty buffer.
+    '''
+    if os.fstat(f.fileno()).st_size:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return b''
+
+def postings_list_bytes(postings_list):
+    '''
+    estimates the number of bytes a decoded postings list takes in memory, with its positions decoded.
+    '''
+    return sum(_posting_bytes + _position_bytes * p.term_frequency for p in postings_list)
+
+class PostingsCache:
+    '''
+    least recently used cache of decoded postings lists, shared by the models of a search engine.
+    the cache is bounded by the approximate number of bytes of its values (see postings_list_bytes)
+    rather than their number, as the postings lists of common terms are far larger than the rest.
+    values larger than the whole budget are not cached.
+    values returned from the cache are shared and must not be modified.
+
+    budget -> maximum approximate number of bytes of cached values, 0 disables the cache.
+    size -> approximate number of bytes of cached values.
+    hits -> number of lookups that found their value in the cache.
+    misses -> number of lookups that did not find their value in the cache.
+    evictions -> number of values evicted to keep the cache within its budget.
+    entries -> dictionary of key -> (value, size), from least to most recently used.
+    '''
+
+    def __init__(self, budget=0):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        '''
+        gets the value of the key, None if it is not cached.
+        '''
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.entries[key][0]
+
+    def put(self, key, value, size):
+        '''
+        caches the value of the key, which takes approximately size bytes,
+        evicting the least recently used values until the cache is within its budget.
+        '''
+        if self.budget <= 0 or size > self.budget:
+            return
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.budget:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        '''
+        removes all values from the cache and resets its metrics.
+        '''
+        self.entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def metrics(self):
+        '''
+        gets the metrics of the cache as a dictionary.
+        '''
+        return {
+            'entries': len(self.entries),
+            'size': self.size,
+            'budget': self.budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __repr__(self):
+        return f'entries: {len(self.entries)}, size: {self.size}/{self.budget}, hits: {self.hits}, misses: {self.misses}, evictions: {self.evictions}'
+
+class PostingsFile:
+    '''
+    read access to a postings file.
+    the file is memory mapped once when opened, and is kept open until closed,
+    so postings lists are read straight from the mapped buffer without reopening the file.
+    the format of the file is detected from its header.
+    binary postings files keep positional indexes in a separate positions file, which is
+    memory mapped as well, postings lists read from them only read positions when they are accessed.
+
+    file_name -> name of the postings file.
+    format -> text_format or binary_format.
+    buffer -> memory mapped contents of the postings file.
+    positions_buffer -> memory mapped contents of the positions file, None for text postings files.
+    cache -> cache of decoded postings lists by offset, with a budget of cache_bytes,
+             so queries that reuse terms share the postings reads. a cache_bytes of 0 disables the cache.
+             postings lists returned from the cache are shared and must not be modified.
+    '''
+
+    def __init__(self, file_name, cache_bytes=0):
+        self.file_name = file_name
+        self.cache = PostingsCache(cache_bytes)
+        self._files = [open(file_name, 'rb')]
+        self.buffer = _map_file(self._files[0])
+        self.positions_buffer = None
+        if self.buffer[:len(_binary_magic)] == _binary_magic:
+            if self.buffer[:len(_binary_header)] != _binary_header:
+                self.close()
+                raise ValueError(f'unsupported binary postings format version: {file_name}')
+            self.format = binary_format
+            self._files.append(open(positions_file_name(file_name), 'rb'))
+            self.positions_buffer = _map_file(self._files[1])
+        else:
+            self.format = text_format
+
+    def read(self, offset):
+        '''
+        reads the postings list at offset, from the cache if it has been read recently.
+        the output is the decompressed postings list.
+        '''
+        postings_list = self.cache.get(offset)
+        if postings_list is None:
+            postings_list = self._read(offset)
+            self.cache.put(offset, postings_list, postings_list_bytes(postings_list))
+        return postings_list
+
+    def cursor(self, offset):
+        '''
+        gets a postings cursor over the postings list at offset.
+        binary postings lists that are not cached are decoded a block at a time as the cursor reaches them,
+        so postings that are skipped over are not decoded, other postings lists are read whole.
+        '''
+        if self.format == binary_format and offset not in self.cache:
+            return BlockPostingsCursor(self.buffer, offset, self.positions_buffer)
+        return PostingsCursor(self.read(offset))
+
+    def _read(self, offset):
+        '''
+        reads and decodes the postings list at offset from the mapped buffers.
+        '''
+        if self.format == binary_format:
+            return PostingsList.decode(self.buffer, offset, self.positions_buffer)
+        end = self.buffer.find(b'\n', offset)
+        line = self.buffer[offset:end if end >= 0 else len(self.buffer)].decode('utf8')
+        return PostingsList.parse(line).decompress()
+
+    def close(self):
+        '''
+        unmaps the buffers and closes the postings and positions files.
+        '''
+        self.cache.clear()
+        for buffer in (self.buffer, self.positions_buffer):
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+        for f in self._files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def write_postings_file(postings_lists, file_name, postings_format=binary_format):
+    '''
+    writes postings lists to file_name in the given format, in the order they are given.
+    text_format writes each postings list as a line of compressed postings.
+    binary_format writes a header followed by the variable byte encoded doc streams of the postings lists,
+    and writes their positions streams to the positions file.
+    returns a list of offsets, where each offset points to the start of a postings list.
+    '''
+    if postings_format not in postings_formats:
+        raise ValueError(f'unknown postings format: {postings_format}')
+    if postings_format == text_format:
+        return _write_text_postings_file(postings_lists, file_name)
+    offsets = []
+    with open(file_name, 'wb') as f, open(positions_file_name(file_name), 'wb') as positions_f:
+        f.write(_binary_header)
+        for postings_list in postings_lists:
+            offsets.append(f.tell())
+            doc_stream, positions_stream = postings_list.encode(positions_f.tell())
+            f.write(doc_stream)
+            positions_f.write(positions_stream)
+    return offsets
+
+def _write_text_postings_file(postings_lists, file_name):
+    '''
+    writes postings lists to file_name, each line denotes a compressed postings list.
+    returns a list of offsets, where each offset points to the start of a postings list.
+    '''
+    offsets = []
+    with open(file_name, 'wb') as f:
+        for postings_list in postings_lists:
+            offsets.append(f.tell())
+            f.write((str(postings_list.compress()) + '\n').encode('utf8'))
+    return offsets
+
+def convert_postings_file(dictionary, postings_file, target_file, postings_format=binary_format):
+    '''
+    rewrites the postings lists of postings_file into target_file in the given format.
+    postings lists are read one at a time in the order they are stored, so the postings file
+    does not have to fit into memory.
+    returns a dictionary of term -> term objects, with offsets that point into target_file.
+    the term objects of dictionary are updated in place if it is a dict, a lexicon is read only.
+    '''
+    dictionary = dict(dictionary.items())
+    terms = sorted(dictionary.values(), key=lambda t: t.offset)
+    with PostingsFile(postings_file) as source:
+        postings_lists = (source.read(t.offset) for t in terms)
+        offsets = write_postings_file(postings_lists, target_file, postings_format)
+    for term, offset in zip(terms, offsets):
+        term.offset = offset
+    return dictionary
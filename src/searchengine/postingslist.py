@@ -1,9 +1,10 @@
+from bisect import bisect_left
 from functools import reduce
 from itertools import accumulate
 
 from .util import inverse_accumulate
-from .util import union
-from .util import within_proximity
+from .util import vbyte_decode
+from .util import vbyte_encode
 
 import re
 
@@ -12,6 +13,22 @@ _posting_delimiter = '/'
 _postingposition_delimiter = ','
 _posting_pattern = re.compile(f'^[0-9]*[{_posting_delimiter}][0-9]*[{_posting_delimiter}][0-9]+({_postingposition_delimiter}[0-9]+)*$')
 
+# number of postings in a block of an encoded postings list, the skip table has an entry for every block.
+_block_size = 128
+
+def decode_skip_table(buffer, offset):
+    '''
+    decodes the header and skip table of a variable byte encoded postings list, starting at offset of buffer.
+    returns the number of postings, the last doc_id of each block, the offset of each block in buffer and the end
+    of the last block, the positions offset of the last posting of each block, and the offset of the first block.
+    '''
+    (size, block_count, _), offset = vbyte_decode(buffer, offset, 3)
+    table, offset = vbyte_decode(buffer, offset, 3 * block_count)
+    last_doc_ids = list(accumulate(table[0::3]))
+    block_offsets = list(accumulate(table[1::3], initial=offset))
+    positions_offsets = list(accumulate(table[2::3]))
+    return size, last_doc_ids, block_offsets, positions_offsets, offset
+
 class PostingsList:
     '''
     represents a postings list, which a list of posting objects.
@@ -19,6 +36,9 @@ class PostingsList:
     postings list represents a term from the dictionary.
     postings lists are compressed when written to disk, using gap encoding.
     when postings lists are read from disk, they are decompressed.
+    postings lists are either written as text (compress) or as variable byte encoded bytes (encode).
+    encoded postings lists keep positional indexes in a separate positions stream,
+    decoded postings lists only read their positions from that stream when they are first accessed.
 
     postings -> list of posting objects.
     '''
@@ -38,35 +58,17 @@ class PostingsList:
         return postings_list
 
     @classmethod
-    def merge(cls, p1, p2, distance):
-        '''
-        linear merge of two postings lists p1 and p2 into another postings list.
-        merge condition:
-        -> posting ids are the same
-        -> there exist positional indexes from both postings that occur at a certain distance. (|index1 - index2| = distance)
-
-        example: 
-        suppose t1 is the term with postings list p1, and t2 is the term with postings list p2.
-        merge(p1, p2, 1) returns a postings list of doc ids where t2 occurs immediately after t1.
-        '''
-        i1, i2 = iter(p1), iter(p2)
-        output = PostingsList()
-        try:
-            n1, n2 = next(i1), next(i2)
-            while 1:
-                id1, id2 = n1.doc_id, n2.doc_id
-                if id1 < id2:
-                    n1 = next(i1)
-                elif id1 > id2:
-                    n2 = next(i2)
-                else:
-                    indexes = within_proximity(n1.positions, n2.positions, distance)
-                    if indexes:
-                        n = Posting(n2.doc_id, term_frequency=len(indexes), positions=indexes)
-                        output.add(n)
-                    n1, n2 = next(i1), next(i2)
-        except StopIteration:
-            return output
+    def decode(cls, buffer, offset, positions_buffer):
+        '''
+        decodes a variable byte encoded postings list, starting at offset of buffer.
+        the buffers can be any bytes-like objects, such as memory mapped postings and positions files.
+        the output is the decompressed postings list, in lazy positions mode:
+        only doc_ids and term frequencies are decoded, and the positions of a posting are decoded
+        from positions_buffer when they are first accessed.
+        '''
+        (size, _, skip_table_length), offset = vbyte_decode(buffer, offset, 3)
+        values, offset = vbyte_decode(buffer, offset + skip_table_length, 3 * size)
+        return PostingsList(_decode_postings(values, 0, 0, positions_buffer))
 
     def add(self, posting):
         '''
@@ -86,6 +88,51 @@ class PostingsList:
             posting.compress()
         return self
 
+    def encode(self, positions_offset=0):
+        '''
+        encodes the postings list with variable byte encoding, into a doc stream and a positions stream.
+        positions_offset is the offset the positions stream will be written at in the positions file.
+        doc stream layout:
+        header -> number of postings, number of blocks, and the number of bytes of the skip table.
+        skip table -> for each block of _block_size postings, the gap between its last doc_id and the last doc_id of
+                      the previous block, its number of bytes, and the gap between the positions offset of its last
+                      posting and that of the previous block, which allow a block to be decoded without the blocks before it.
+        blocks -> for each posting, doc_id gap, term_frequency and the gap between its positions offset
+                  and the previous posting's positions offset.
+        positions stream layout: for each posting, its positional index gaps.
+        the number of positions of each posting must be equal to its term_frequency.
+        unlike compress(), the postings list is not modified.
+        returns the encoded doc stream and positions stream.
+        '''
+        values = []
+        positions_stream = []
+        doc_id_gaps = inverse_accumulate([p.doc_id for p in self.postings])
+        positions_offsets = []
+        previous_offset = 0
+        for doc_id_gap, posting in zip(doc_id_gaps, self.postings):
+            if posting.term_frequency != len(posting.positions):
+                raise ValueError(f'term frequency does not match positions: {posting}')
+            values.extend([doc_id_gap, posting.term_frequency, positions_offset - previous_offset])
+            positions_offsets.append(positions_offset)
+            encoded_positions = vbyte_encode(inverse_accumulate(posting.positions))
+            positions_stream.append(encoded_positions)
+            previous_offset = positions_offset
+            positions_offset += len(encoded_positions)
+
+        blocks = []
+        skip_table = []
+        previous_doc_id = 0
+        previous_offset = 0
+        for start in range(0, len(self.postings), _block_size):
+            end = min(start + _block_size, len(self.postings))
+            blocks.append(vbyte_encode(values[3 * start:3 * end]))
+            last_doc_id, last_offset = self.postings[end - 1].doc_id, positions_offsets[end - 1]
+            skip_table.extend([last_doc_id - previous_doc_id, len(blocks[-1]), last_offset - previous_offset])
+            previous_doc_id, previous_offset = last_doc_id, last_offset
+        skip_table = vbyte_encode(skip_table)
+        header = vbyte_encode([len(self.postings), len(blocks), len(skip_table)])
+        return header + skip_table + b''.join(blocks), b''.join(positions_stream)
+
     def decompress(self):
         '''
         decompresses postings list back from compressed state, reversing the gap encoding.
@@ -116,6 +163,132 @@ class PostingsList:
         return _postingslist_delimiter.join([str(p) for p in self.postings])
 
 
+def _decode_postings(values, doc_id, positions_offset, positions_buffer):
+    '''
+    builds the postings of decoded (doc_id gap, term_frequency, positions offset gap) values, in lazy positions mode,
+    continuing from the doc_id and positions offset of the posting before them.
+    '''
+    postings = []
+    for i in range(0, len(values), 3):
+        doc_id += values[i]
+        positions_offset += values[i + 2]
+        postings.append(Posting(doc_id, values[i + 1], positions_offset=positions_offset, positions_buffer=positions_buffer))
+    return postings
+
+class PostingsCursor:
+    '''
+    cursor over the postings of a postings list, in doc_id order.
+    the cursor can skip ahead to the first posting with a doc_id that is >= a given doc_id.
+
+    postings -> list of posting objects.
+    doc_ids -> doc_ids of the postings, to search for doc_ids to skip to.
+    index -> index of the current posting.
+    '''
+
+    def __init__(self, postings_list):
+        self.postings = postings_list.postings
+        self.doc_ids = [p.doc_id for p in self.postings]
+        self.index = 0
+
+    def doc_id(self):
+        '''
+        returns the doc_id of the current posting, or None if the cursor is exhausted.
+        '''
+        if self.index < len(self.doc_ids):
+            return self.doc_ids[self.index]
+        return None
+
+    def posting(self):
+        '''
+        returns the current posting.
+        '''
+        return self.postings[self.index]
+
+    def next(self):
+        '''
+        moves the cursor to the next posting.
+        '''
+        self.index += 1
+
+    def next_geq(self, doc_id):
+        '''
+        moves the cursor to the first posting with a doc_id >= doc_id,
+        skipping the postings in between.
+        the posting is found by galloping: steps that double in size are taken until a doc_id >= doc_id is passed,
+        then the last step is binary searched, so short skips only look at a few doc_ids.
+        '''
+        doc_ids = self.doc_ids
+        low = self.index
+        step = 1
+        while low + step < len(doc_ids) and doc_ids[low + step] < doc_id:
+            low += step
+            step *= 2
+        self.index = bisect_left(doc_ids, doc_id, low, min(low + step, len(doc_ids)))
+
+class BlockPostingsCursor(PostingsCursor):
+    '''
+    cursor over a variable byte encoded postings list (see PostingsList.encode), in doc_id order.
+    the postings are decoded a block at a time when the cursor reaches them.
+    skipping ahead past the current block looks up the block of the doc_id in the skip table,
+    so the blocks in between are never decoded.
+
+    buffer -> buffer of the doc stream.
+    positions_buffer -> buffer of the positions stream.
+    size -> number of postings.
+    last_doc_ids -> last doc_id of each block.
+    block_offsets -> offset of each block in buffer, and the end of the last block.
+    positions_offsets -> positions offset of the last posting of each block.
+    block -> index of the decoded block.
+    postings, doc_ids, index -> postings of the decoded block, their doc_ids, and the index of the current posting.
+    '''
+
+    def __init__(self, buffer, offset, positions_buffer):
+        self.buffer = buffer
+        self.positions_buffer = positions_buffer
+        self.size, self.last_doc_ids, self.block_offsets, self.positions_offsets, _ = decode_skip_table(buffer, offset)
+        self.block = -1
+        self.postings = []
+        self.doc_ids = []
+        self.index = 0
+        self._decode_block(0)
+
+    def _decode_block(self, block):
+        '''
+        decodes the postings of the block, and moves the cursor to its first posting.
+        '''
+        self.block = block
+        self.index = 0
+        if block >= len(self.last_doc_ids):
+            self.postings = []
+            self.doc_ids = []
+            return
+        count = min(_block_size, self.size - block * _block_size)
+        values, _ = vbyte_decode(self.buffer, self.block_offsets[block], 3 * count)
+        doc_id = self.last_doc_ids[block - 1] if block else 0
+        positions_offset = self.positions_offsets[block - 1] if block else 0
+        self.postings = _decode_postings(values, doc_id, positions_offset, self.positions_buffer)
+        self.doc_ids = [p.doc_id for p in self.postings]
+
+    def next(self):
+        '''
+        moves the cursor to the next posting, decoding the next block at the end of a block.
+        '''
+        self.index += 1
+        if self.index == len(self.doc_ids):
+            self._decode_block(self.block + 1)
+
+    def next_geq(self, doc_id):
+        '''
+        moves the cursor to the first posting with a doc_id >= doc_id,
+        decoding only the block of that posting.
+        '''
+        if self.block >= len(self.last_doc_ids):
+            return
+        if doc_id > self.last_doc_ids[self.block]:
+            self._decode_block(bisect_left(self.last_doc_ids, doc_id, self.block + 1))
+        super().next_geq(doc_id)
+
+
 class Posting:
     '''
     represents a collection of data:
@@ -124,12 +297,33 @@ class Posting:
     positions -> zero-based positional indexes of where this term occurs in document of doc_id.
 
     similar to postings list, the positional indexes are compressed with gap encoding.
+
+    a posting decoded in lazy positions mode holds a positions_buffer and a positions_offset instead,
+    the positions are decoded from the buffer the first time they are accessed.
     '''
 
-    def __init__(self, doc_id, term_frequency=0, positions=[]):
+    def __init__(self, doc_id, term_frequency=0, positions=[], positions_offset=-1, positions_buffer=None):
         self.doc_id = doc_id
         self.term_frequency = term_frequency
-        self.positions = [p for p in positions]
+        self._positions = [p for p in positions]
+        self._positions_offset = positions_offset
+        self._positions_buffer = positions_buffer
+
+    @property
+    def positions(self):
+        '''
+        positional indexes of the posting, decoded from the positions buffer on first access in lazy positions mode.
+        '''
+        if self._positions_buffer is not None:
+            gaps, _ = vbyte_decode(self._positions_buffer, self._positions_offset, self.term_frequency)
+            self._positions = [p for p in accumulate(gaps)]
+            self._positions_buffer = None
+        return self._positions
+
+    @positions.setter
+    def positions(self, positions):
+        self._positions = positions
+        self._positions_buffer = None
 
     @classmethod
     def parse(cls, posting_string):
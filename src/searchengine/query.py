@@ -1,4 +1,5 @@
 from .util import stem
+from .util import has_any_alphanumeric
 
 import re
 
@@ -6,6 +7,16 @@ single_quote = '\''
 double_quote = '"'
 and_operator = 'AND'
 
+def _split_words(text, tokenizer):
+    '''
+    splits text into words with the tokenizer the index was built with,
+    keeping only words with an alphanumeric character, as only those are indexed as terms.
+    without a tokenizer, text is split on spaces.
+    '''
+    if tokenizer is None:
+        return text.strip().split(' ')
+    return [w for w in tokenizer.tokenize(text) if has_any_alphanumeric(w)]
+
 class Query:
     '''
     represents a query.
@@ -20,18 +31,22 @@ class Query:
         self.is_boolean_query = is_boolean_query
 
     @classmethod
-    def parse_free_text_query(cls, line):
+    def parse_free_text_query(cls, line, tokenizer=None):
         '''
         parses a line into a query object for vector space retrieval.
+        the line is split into words with the tokenizer, see _split_words.
         '''
-        raw_terms = [t.strip().casefold() for t in line.strip().split(' ')]
+        raw_terms = [t.strip().casefold() for t in _split_words(line, tokenizer)]
         terms = [stem(t) for t in raw_terms] # stems each term in the line.
         return Query(raw_terms=raw_terms, terms=terms, is_boolean_query=False)
 
     @classmethod
-    def parse_boolean_query(cls, line):
+    def parse_boolean_query(cls, line, tokenizer=None):
         '''
         parses a line into a query object for boolean retrieval.
+        terms and phrases are split into words with the tokenizer, see _split_words.
+        a term the tokenizer splits into several words (employer's -> employer 's) is searched as a phrase,
+        as the words are indexed at adjacent positions.
         any invalid format in line will throw a ParseError.
         checks for:
         1. "AND" must be inbetween terms/phrases
@@ -49,10 +64,11 @@ class Query:
             if not token.startswith(double_quote) and not token.endswith(double_quote):
                 if len(token.split(' ')) > 1:
                     raise ParseError(f'multiple terms should be in a phrase wrapped in quotes: {token}')
-                terms.append(stem(token))
+                words = _split_words(token, tokenizer) or [token]
+                terms.append(' '.join([stem(w) for w in words]))
             elif token.startswith(double_quote) and token.endswith(double_quote):
                 phrase = token[1:-1].strip()
-                phrase_tokens = [stem(t) for t in phrase.split(' ')]
+                phrase_tokens = [stem(t) for t in _split_words(phrase, tokenizer) or [phrase]]
                 stemmed_phrase = ' '.join(phrase_tokens)
                 terms.append(stemmed_phrase)
             else:
@@ -61,18 +77,19 @@ class Query:
         return Query(raw_terms=tokens, terms=terms, is_boolean_query=True)
 
     @classmethod
-    def parse(cls, line):
+    def parse(cls, line, tokenizer=None):
         '''
         parses line and determines the type of query the line contains.
         if there is "AND" or double quotes in the line, 
         it indicates that the query contains a phrase / and operator.
         therefore it would mean that the query requires exact match.
         if not, then it is a free text query.
+        words are split with the tokenizer the index was built with, or on spaces without a tokenizer.
         '''
         if and_operator in line or double_quote in line:
-            return cls.parse_boolean_query(line)
+            return cls.parse_boolean_query(line, tokenizer)
         else:
-            return cls.parse_free_text_query(line)
+            return cls.parse_free_text_query(line, tokenizer)
 
                         
     def __repr__(self):
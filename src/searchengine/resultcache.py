@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from pickle import dump
+from pickle import load
+
+import os
+import tempfile
+import time
+
+class ResultCache:
+    '''
+    least recently used cache of search results, so searches that are run again skip query expansion and ranking.
+    results are keyed by the terms of the parsed query, whether it is a boolean query, the relevant doc ids
+    and the number of results ranked (see key). the relevant doc ids are kept in their given order,
+    as relevant documents are ranked at the top in that order.
+    the cache belongs to a version of the index, such as the generation and segment names of an index directory,
+    and is cleared when it is used with another version, so results of an older index are never returned.
+
+    size -> maximum number of results kept in the cache, 0 disables the cache.
+    ttl -> number of seconds a result is kept for, None keeps results until they are evicted.
+    version -> version of the index the cached results were ranked on.
+    hits -> number of lookups that found a result in the cache.
+    misses -> number of lookups that did not find a result, or found an expired one.
+    evictions -> number of results evicted to keep the cache within its size.
+    entries -> dictionary of key -> (time the result was cached, result), from least to most recently used.
+    '''
+
+    def __init__(self, size=1024, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(query, relevant_doc_ids, limit):
+        '''
+        gets the key of the results of a query, given the relevant doc ids and the number of results ranked.
+        '''
+        return tuple(query.terms), query.is_boolean_query, tuple(relevant_doc_ids), limit
+
+    def validate(self, version):
+        '''
+        clears the cache if its results were ranked on another version of the index.
+        '''
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key):
+        '''
+        gets the cached result of the key, None if it is not cached or has expired.
+        '''
+        entry = self.entries.get(key)
+        if entry is None or (self.ttl is not None and time.time() - entry[0] > self.ttl):
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, result):
+        '''
+        caches the result of the key, evicting the least recently used result if the cache is full.
+        '''
+        if self.size <= 0:
+            return
+        self.entries[key] = (time.time(), result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def save(self, file_to_write):
+        '''
+        serializes the version and the cached results to the file_to_write using the pickle library.
+        the file is replaced in a single rename, so it is never left half written.
+        '''
+        directory = os.path.dirname(os.path.abspath(file_to_write))
+        fd, temporary_file = tempfile.mkstemp(prefix='.results-', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            dump((self.version, list(self.entries.items())), f)
+        os.replace(temporary_file, file_to_write)
+
+    def load(self, file_to_load):
+        '''
+        replaces the cached results with the results stored in the file_to_load, with their version,
+        so a restarted server keeps the results that are still valid for its index.
+        expired results are not loaded.
+        '''
+        with open(file_to_load, 'rb') as f:
+            version, entries = load(f)
+        self.entries.clear()
+        self.version = version
+        now = time.time()
+        for key, (cached_time, result) in entries[-self.size:] if self.size > 0 else []:
+            if self.ttl is None or now - cached_time <= self.ttl:
+                self.entries[key] = (cached_time, result)
+
+    def clear(self):
+        '''
+        removes all results from the cache and resets its metrics.
+        '''
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def metrics(self):
+        '''
+        gets the metrics of the cache as a dictionary.
+        '''
+        return {
+            'entries': len(self.entries),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __repr__(self):
+        return f'size: {len(self.entries)}/{self.size}, hits: {self.hits}, misses: {self.misses}, evictions: {self.evictions}'
@@ -1,6 +1,29 @@
 from functools import reduce
 from .booleanretrievalmodel import BooleanRetrievalModel
+from .impacts import ImpactFile
+from .indexdirectory import load_manifest
+from .indexdirectory import segment_files
+from .indexdirectory import verify_index
+from .postingsfile import PostingsFile
+from .query import Query
+from .resultcache import ResultCache
+from .segments import Segment
+from .segments import SegmentedDictionary
+from .segments import SegmentedDocuments
+from .segments import SegmentedPostingsFile
+from .synonyms import SynonymTable
+from .synonyms import SynonymTables
+from .tokenizer import get_tokenizer
+from .util import load_dictionary
+from .util import load_documents
+from .util import stem_cache
 from .vectorspacemodel import VectorSpaceModel
+from .vectorspacemodel import python_engine
+
+import os
+
+# budget of the postings cache of a search engine, in bytes.
+default_cache_bytes = 64 << 20
 
 class SearchEngine:
     '''
@@ -10,36 +33,148 @@ class SearchEngine:
 
     dictionary -> dictionary of term -> term object containing information.
     documents -> dictionary of doc_id -> document object containing meta data and vectors.
-    postings_file -> file to read postings list from.
+    postings_file -> postings file to read postings lists from, memory mapped while the engine is open.
+                     caches decoded postings lists up to a budget of cache_bytes, shared by both models,
+                     so the ranking passes of a query and queries that reuse terms do not decode them again.
+                     given as a file name, or as a postings file object that is already open.
     boolean_retrieval_model -> model to run boolean queries on.
-    vector_space_model -> model to run free text queries on.
+    vector_space_model -> model to run free text queries on, ranking documents with the given engine.
+    synonyms -> synonym table of the index to expand free text queries with, closed with the search engine.
+                None looks synonyms up in wordnet.
+    impacts -> impact ordered postings of the index, closed with the search engine, or None.
+               free text queries are ranked by impact once vector_space_model has a postings or time budget.
+    tokenizer -> tokenizer the index was built with, to split queries into words with.
+                 None splits queries on spaces.
+    index_directory -> index directory the search engine was opened from, None if it was given the index files.
+    manifest -> manifest of the index directory the search engine was opened from.
+    version -> version of the index, the generation and the names of the segments of the index directory the search
+               engine was opened from, or the modification time of the postings file it was given.
+               segment names are unique, so a directory that is removed and built again does not repeat a version.
+    result_cache -> result cache to look searches up in before running them, see ResultCache. None disables it.
+                    the cache is cleared when it is used with another version of the index.
     '''
 
-    def __init__(self, dictionary, documents, postings_file):
+    def __init__(self, dictionary, documents, postings_file, cache_bytes=default_cache_bytes, engine=python_engine, tokenizer=None,
+                 synonyms=None, impacts=None):
         self.dictionary = dictionary
         self.documents = documents
-        self.postings_file = postings_file
-        self.boolean_retrieval_model = BooleanRetrievalModel(dictionary, postings_file)
-        self.vector_space_model = VectorSpaceModel(dictionary, documents, postings_file)
+        if isinstance(postings_file, PostingsFile):
+            self.postings_file = postings_file
+        else:
+            self.postings_file = PostingsFile(postings_file, cache_bytes)
+        self.boolean_retrieval_model = BooleanRetrievalModel(dictionary, self.postings_file)
+        self.synonyms = synonyms
+        self.impacts = impacts
+        self.vector_space_model = VectorSpaceModel(dictionary, documents, self.postings_file, engine, synonyms, impacts=impacts)
+        self.tokenizer = None if tokenizer is None else get_tokenizer(tokenizer)
+        self.index_directory = None
+        self.manifest = None
+        self.version = None if self.postings_file.file_name is None else os.stat(self.postings_file.file_name).st_mtime_ns
+        self.result_cache = None
+        self._index = []
+
+    @classmethod
+    def open(cls, index_directory, cache_bytes=default_cache_bytes, engine=python_engine, verify=False):
+        '''
+        opens a search engine on the index in index_directory, from the segments listed in its manifest.
+        queries are tokenized with the tokenizer recorded in the manifest.
+        if verify is set, the files are checked against the checksums in the manifest first.
+        a single segment without deleted documents is opened from its files, otherwise the segments
+        are searched together, see SegmentedDictionary, SegmentedDocuments and SegmentedPostingsFile.
+        the dictionary and documents are closed with the search engine.
+        segments are only ranked by impact when the index is opened from the files of a single segment.
+        '''
+        manifest = load_manifest(index_directory)
+        if verify:
+            verify_index(index_directory, manifest)
+        for segment in manifest['segments']:
+            files = segment_files(index_directory, segment)
+            if 'stems' in files:
+                stem_cache.load(files['stems'])
+        if len(manifest['segments']) == 1 and not manifest['segments'][0]['deleted']:
+            files = segment_files(index_directory, manifest['segments'][0])
+            dictionary = load_dictionary(files['dictionary'])
+            documents = load_documents(files['documents'], dictionary)
+            postings_file = files['postings']
+            index = [dictionary, documents]
+            synonyms = SynonymTable(files['synonyms'], dictionary) if 'synonyms' in files else None
+            impacts = ImpactFile(files['impacts'], dictionary) if 'impacts' in files else None
+        else:
+            index = [Segment(index_directory, segment) for segment in manifest['segments']]
+            dictionary = SegmentedDictionary(index)
+            documents = SegmentedDocuments(index)
+            postings_file = SegmentedPostingsFile(index, cache_bytes)
+            synonyms = None
+            impacts = None
+            if all('synonyms' in segment['files'] for segment in manifest['segments']):
+                synonyms = SynonymTables([SynonymTable(segment_files(index_directory, entry)['synonyms'], segment.dictionary)
+                                          for entry, segment in zip(manifest['segments'], index)])
+        search_engine = cls(dictionary, documents, postings_file, cache_bytes, engine, manifest['tokenizer'], synonyms, impacts)
+        search_engine.index_directory = index_directory
+        search_engine.manifest = manifest
+        search_engine.version = (manifest['generation'], tuple(segment['name'] for segment in manifest['segments']))
+        search_engine._index = index
+        return search_engine
+
+    def close(self):
+        '''
+        closes the postings file, the synonym table and the impact ordered postings,
+        and the dictionary and documents if the search engine was opened from an index directory.
+        '''
+        if self.vector_space_model.scorer is not None:
+            self.vector_space_model.scorer.close() # its arrays view the columns of the documents.
+        self.postings_file.close()
+        for index in (self.synonyms, self.impacts):
+            if index is not None:
+                index.close()
+        for index in self._index:
+            if hasattr(index, 'close'):
+                index.close()
+
+    def parse(self, line):
+        '''
+        parses a query line with the tokenizer the index was built with, see Query.parse.
+        '''
+        return Query.parse(line, self.tokenizer)
+
+    def __enter__(self):
+        return self
 
-    def search(self, query, relevant_doc_ids):
+    def __exit__(self, *args):
+        self.close()
+
+    def search(self, query, relevant_doc_ids, k=None, offset=0):
         '''
         runs a search on the given query, given the relevant_doc_ids
         from relevance judgements.
         if a query is a boolean query, run it on the boolean retrieval model.
         if not, run it on the vector space model.
+        returns a page of the ranking, the k doc ids after the first offset doc ids.
+        if k is not given, the rest of the ranking after offset is returned.
+        rankings are looked up in the result cache first, and cached once they are run.
         '''
         terms = query.terms
-        if query.is_boolean_query:
-            return self._search_boolean(terms, relevant_doc_ids)
-        else:
-            return self._search_free_text(terms, relevant_doc_ids)
+        limit = None if k is None else offset + k
+        key = ResultCache.key(query, relevant_doc_ids, None if query.is_boolean_query else limit)
+        result = None
+        if self.result_cache is not None:
+            self.result_cache.validate(self.version)
+            result = self.result_cache.get(key)
+        if result is None:
+            if query.is_boolean_query:
+                result = self._search_boolean(terms, relevant_doc_ids)
+            else:
+                result = self._search_free_text(terms, relevant_doc_ids, limit)
+            if self.result_cache is not None:
+                self.result_cache.put(key, result)
+        return result[offset:limit]
 
     def _search_boolean(self, terms, relevant_doc_ids):
         '''
         obtains a set of docids from running the terms on the boolean retrieval model.
         then flatten the terms and run a free text search on the vector space model for ranking order.
-        then filter the ranked result against the docids from the boolean retrieval model search.
+        only the docids from the boolean retrieval model search are ranked, so the documents that only
+        contain some of the terms are not scored, and the ranking is the same as filtering a full ranking.
         relevant doc ids from relevance judgements are ranked at the top.
         '''
         boolean_result_set = self.boolean_retrieval_model.retrieve(terms)
@@ -48,7 +183,7 @@ class SearchEngine:
         for term in terms:
             flattened_terms.extend([t.strip() for t in term.split(' ')])
 
-        vector_result = self.vector_space_model.get_ranking(flattened_terms, relevant_doc_ids)
+        vector_result = self.vector_space_model.get_ranking(flattened_terms, relevant_doc_ids, candidates=boolean_result_set)
         relevant_doc_set = set(relevant_doc_ids)
         result = [d for d in relevant_doc_ids]
         for r in vector_result:
@@ -60,8 +195,9 @@ class SearchEngine:
 
         return result
         
-    def _search_free_text(self, terms, relevant_doc_ids):
+    def _search_free_text(self, terms, relevant_doc_ids, k=None):
         '''
         runs a search on terms in the vector space model, returning a list of ranked doc ids.
+        only the top k doc ids are ranked if k is given.
         '''
-        return self.vector_space_model.retrieve(terms, relevant_doc_ids)
+        return self.vector_space_model.retrieve(terms, relevant_doc_ids, k)
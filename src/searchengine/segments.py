@@ -0,0 +1,173 @@
+from collections.abc import Mapping
+from heapq import merge
+from itertools import groupby
+
+from .documentstore import get_lengths
+from .postingsfile import PostingsCache
+from .postingsfile import PostingsFile
+from .postingslist import PostingsList
+from .term import Term
+from .util import load_dictionary
+from .util import load_documents
+
+import os
+
+segmented_format = 'segmented'
+
+class Segment:
+    '''
+    a segment of an index directory, an index built from a single data file, opened for reading.
+    documents of a segment are deleted with tombstones: their doc ids are listed in the segment's entry
+    of the manifest, and they are skipped when the segment is read, until segments are merged.
+
+    name -> name of the segment.
+    dictionary -> dictionary of term -> term objects of the segment.
+    documents -> dictionary of doc_id -> document objects of the segment, including deleted documents.
+    postings_file -> postings file object of the segment.
+    deleted -> set of deleted doc ids of the segment.
+    '''
+
+    def __init__(self, index_directory, entry):
+        files = {kind: os.path.join(index_directory, name) for kind, name in entry['files'].items()}
+        self.name = entry['name']
+        self.dictionary = load_dictionary(files['dictionary'])
+        self.documents = load_documents(files['documents'], self.dictionary)
+        self.postings_file = PostingsFile(files['postings'])
+        self.deleted = set(entry['deleted'])
+
+    def live_doc_ids(self):
+        '''
+        generates the doc ids of the segment that are not deleted, in increasing order.
+        '''
+        return (doc_id for doc_id in self.documents if doc_id not in self.deleted)
+
+    def read(self, offset):
+        '''
+        reads the postings list at offset of the segment's postings file, without the postings of deleted documents.
+        '''
+        postings_list = self.postings_file.read(offset)
+        if not self.deleted:
+            return postings_list
+        return PostingsList([p for p in postings_list if p.doc_id not in self.deleted])
+
+    def close(self):
+        '''
+        closes the postings file, dictionary and documents of the segment.
+        '''
+        self.postings_file.close()
+        for index in (self.dictionary, self.documents):
+            if hasattr(index, 'close'):
+                index.close()
+
+class SegmentedDictionary(Mapping):
+    '''
+    read only dictionary of term -> term objects over several segments.
+    the doc frequency of a term is the sum of its doc frequencies in the segments (deleted documents are still
+    counted until segments are merged), its max score is the largest of its max scores, and its offset is a tuple of
+    (segment index, offset) pairs of the segments that contain it, to read with a SegmentedPostingsFile.
+
+    segments -> list of segments, from oldest to newest.
+    '''
+
+    def __init__(self, segments):
+        self.segments = segments
+        self._size = None
+
+    def __getitem__(self, term):
+        doc_frequency = 0
+        offsets = []
+        max_scores = []
+        for i, segment in enumerate(self.segments):
+            segment_term = segment.dictionary.get(term)
+            if segment_term is not None:
+                doc_frequency += segment_term.doc_frequency
+                offsets.append((i, segment_term.offset))
+                max_scores.append(getattr(segment_term, 'max_score', None))
+        if not offsets:
+            raise KeyError(term)
+        output = Term(doc_frequency, offset=tuple(offsets))
+        del output.line
+        if None in max_scores:
+            del output.max_score
+        else:
+            output.max_score = max(max_scores)
+        return output
+
+    def __contains__(self, term):
+        return any(term in segment.dictionary for segment in self.segments)
+
+    def __iter__(self):
+        terms = merge(*[sorted(segment.dictionary) for segment in self.segments])
+        return (term for term, _ in groupby(terms))
+
+    def __len__(self):
+        if self._size is None:
+            self._size = sum(1 for _ in self)
+        return self._size
+
+class SegmentedPostingsFile(PostingsFile):
+    '''
+    read access to the postings of several segments, with the offsets of a SegmentedDictionary.
+    the postings lists of a term in the segments are merged in doc_id order, without deleted documents.
+    a doc id is only live in one segment, as updated documents are deleted from older segments.
+    merged postings lists are cached like the postings lists of a postings file.
+
+    segments -> list of segments, from oldest to newest.
+    '''
+
+    def __init__(self, segments, cache_bytes=0):
+        self.file_name = None
+        self.cache = PostingsCache(cache_bytes)
+        self.format = segmented_format
+        self.buffer = None
+        self.positions_buffer = None
+        self.segments = segments
+
+    def _read(self, offsets):
+        postings_lists = [self.segments[i].read(offset) for i, offset in offsets]
+        if len(postings_lists) == 1:
+            return postings_lists[0]
+        return PostingsList(merge(*[p.postings for p in postings_lists], key=lambda p: p.doc_id))
+
+    def close(self):
+        '''
+        clears the cache, the segments are closed by their owner.
+        '''
+        self.cache.clear()
+
+class SegmentedColumn(Mapping):
+    '''
+    read only mapping of doc_id -> value of a document column over several segments,
+    the value of a doc id is read from the newest segment where it is not deleted.
+
+    segments -> list of segments, from oldest to newest.
+    columns -> column of each segment.
+    '''
+
+    def __init__(self, segments, columns):
+        self.segments = segments
+        self.columns = columns
+
+    def __getitem__(self, doc_id):
+        for segment, column in zip(reversed(self.segments), reversed(self.columns)):
+            if doc_id in column and doc_id not in segment.deleted:
+                return column[doc_id]
+        raise KeyError(doc_id)
+
+    def __iter__(self):
+        return merge(*[segment.live_doc_ids() for segment in self.segments])
+
+    def __len__(self):
+        return sum(len(segment.documents) - len(segment.deleted) for segment in self.segments)
+
+class SegmentedDocuments(SegmentedColumn):
+    '''
+    read only dictionary of doc_id -> document objects over several segments,
+    a document is read from the newest segment where it is not deleted.
+
+    lengths -> column of doc_id -> document length over the segments.
+    '''
+
+    def __init__(self, segments):
+        super().__init__(segments, [segment.documents for segment in segments])
+        self.lengths = SegmentedColumn(segments, [get_lengths(segment.documents) for segment in segments])
@@ -0,0 +1,164 @@
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from threading import Lock
+
+from .indexdirectory import manifest_file_name
+from .query import ParseError
+from .searchengine import SearchEngine
+
+import json
+import os
+import sys
+
+class SearchServer(ThreadingHTTPServer):
+    '''
+    http server that answers queries with a search engine,
+    the index is loaded once and stays resident across queries.
+
+    endpoints:
+    GET /health -> {"status": "ok", "documents": <number of documents>, "terms": <number of terms>, "generation": <generation>,
+                    "postings_cache": <metrics>}
+        generation is the generation of the index directory being served, null if the search engine
+        was not opened from an index directory. postings_cache holds the metrics of the postings cache,
+        see PostingsCache.metrics, and result_cache holds the metrics of the result cache if the search engine has one,
+        see ResultCache.metrics.
+    POST /search with {"query": <query>, "relevant_doc_ids": [<doc id>, ...], "k": <number of results>, "offset": <offset>}
+        -> {"results": [<doc id>, ...]}
+        the query follows the same syntax as Query.parse, and is split into words with the tokenizer
+        the index was built with. relevant_doc_ids, k and offset are optional.
+        results are paged, k results are returned after skipping the first offset results.
+        without k, the rest of the ranking after offset is returned.
+        invalid requests and queries that fail to parse respond with status 400 and {"error": <message>}.
+
+    if the search engine was opened from an index directory, the manifest is checked before every search,
+    and when a new index has been built into the directory, a search engine is opened on it and replaces
+    the current one, which is closed. the server keeps serving the current index if the new one fails to open.
+
+    search_engine -> search engine to run queries on.
+    lock -> serializes searches on the search engine, requests are handled on separate threads,
+            so health checks are answered while a search is running.
+    status -> health of the search engine, updated whenever the search engine is replaced.
+    '''
+
+    def __init__(self, search_engine, address):
+        super().__init__(address, SearchRequestHandler)
+        self.search_engine = search_engine
+        self.lock = Lock()
+        self._manifest_time = self._get_manifest_time()
+        self.status = self._get_status()
+
+    def _get_manifest_time(self):
+        '''
+        gets the modification time of the manifest of the index directory being served, None if there is none.
+        '''
+        if self.search_engine.index_directory is None:
+            return None
+        try:
+            return os.stat(manifest_file_name(self.search_engine.index_directory)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _get_status(self):
+        '''
+        gets the status of the server and the size of its index.
+        '''
+        manifest = self.search_engine.manifest
+        return {
+            'status': 'ok',
+            'documents': len(self.search_engine.documents),
+            'terms': len(self.search_engine.dictionary),
+            'generation': None if manifest is None else manifest['generation'],
+        }
+
+    def reload(self):
+        '''
+        replaces the search engine with one on the current index of its index directory,
+        if the manifest has changed since the search engine was opened. must be called with the lock held.
+        '''
+        manifest_time = self._get_manifest_time()
+        if manifest_time is None or manifest_time == self._manifest_time:
+            return
+        self._manifest_time = manifest_time
+        current = self.search_engine
+        try:
+            search_engine = SearchEngine.open(current.index_directory, current.postings_file.cache.budget,
+                                              current.vector_space_model.engine)
+        except (OSError, ValueError) as e:
+            print(f'failed to reload index from {current.index_directory}: {e}', file=sys.stderr)
+            return
+        if search_engine.version == current.version:
+            search_engine.close()
+            return
+        search_engine.result_cache = current.result_cache # cleared on the first search of the new version.
+        self.search_engine = search_engine
+        self.status = self._get_status()
+        current.close()
+
+    def search(self, line, relevant_doc_ids, k=None, offset=0):
+        '''
+        parses the query line and runs it on the search engine.
+        '''
+        with self.lock:
+            self.reload()
+            query = self.search_engine.parse(line)
+            return self.search_engine.search(query, relevant_doc_ids, k, offset)
+
+    def health(self):
+        '''
+        gets the status of the server, the size of its index and the metrics of its postings cache,
+        without waiting for a running search.
+        '''
+        search_engine = self.search_engine
+        status = {**self.status, 'postings_cache': search_engine.postings_file.cache.metrics()}
+        if search_engine.result_cache is not None:
+            status['result_cache'] = search_engine.result_cache.metrics()
+        return status
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    '''
+    handles json requests to the search server.
+    '''
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._respond(200, self.server.health())
+        else:
+            self._respond(404, {'error': f'not found: {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/search':
+            self._respond(404, {'error': f'not found: {self.path}'})
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            request = json.loads(body)
+            line = request['query']
+            relevant_doc_ids = [int(d) for d in request.get('relevant_doc_ids', [])]
+            k = request.get('k')
+            offset = request.get('offset', 0)
+            if not isinstance(line, str):
+                raise ValueError('query must be a string')
+            if k is not None and (type(k) is not int or k < 0):
+                raise ValueError('k must be a non-negative integer')
+            if type(offset) is not int or offset < 0:
+                raise ValueError('offset must be a non-negative integer')
+        except (KeyError, TypeError, ValueError) as e:
+            self._respond(400, {'error': f'invalid request: {e}'})
+            return
+        try:
+            results = self.server.search(line, relevant_doc_ids, k, offset)
+        except ParseError as e:
+            self._respond(400, {'error': f'parse error encountered: {e}'})
+            return
+        self._respond(200, {'results': results})
+
+    def _respond(self, status, body):
+        '''
+        writes body as a json response with the given status.
+        '''
+        data = json.dumps(body).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
@@ -0,0 +1,131 @@
+from .lexicon import Lexicon
+from .lexicon import term_ids
+from .util import get_synonyms
+from .util import stem
+
+import mmap
+import os
+import struct
+
+_synonyms_magic = b'LCRSYNONYMS'
+_synonyms_version = 1
+_synonyms_header = _synonyms_magic + bytes([_synonyms_version])
+
+# number of terms and number of synonym term ids, after the header.
+_counts = struct.Struct('<QQ')
+
+def synonyms_file_name(dictionary_file):
+    '''
+    gets the name of the synonym table file of a dictionary file.
+    '''
+    return f'{dictionary_file}.synonyms'
+
+def write_synonym_table(dictionary, file_to_write):
+    '''
+    writes the synonyms of every term of dictionary to file_to_write, as the term ids of the synonyms in its lexicon.
+    the synonyms of a term are the stems of the lemmas of its wordnet synsets that are terms of dictionary,
+    so lemmas that cannot match any postings, such as multi word lemmas, are left out.
+    layout, with integers in little endian:
+    header -> magic and version, and the number of terms and synonym term ids.
+    offsets -> start of the synonyms of each term, in term id order, and the end of the last term's synonyms, 8 bytes each.
+    synonyms -> sorted synonym term ids of each term, 4 bytes each.
+    '''
+    ids = term_ids(dictionary)
+    offsets = [0]
+    synonyms = []
+    for term in sorted(ids, key=ids.get):
+        synonyms.extend(sorted({ids[s] for s in (stem(lemma) for lemma in get_synonyms(term)) if s in ids}))
+        offsets.append(len(synonyms))
+    with open(file_to_write, 'wb') as f:
+        f.write(_synonyms_header)
+        f.write(_counts.pack(len(ids), len(synonyms)))
+        f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        f.write(struct.pack(f'<{len(synonyms)}I', *synonyms))
+
+def load_synonym_table(dictionary_file, dictionary):
+    '''
+    opens the synonym table written next to the dictionary file, None if the index has none.
+    '''
+    file_name = synonyms_file_name(dictionary_file)
+    if not os.path.exists(file_name):
+        return None
+    return SynonymTable(file_name, dictionary)
+
+class SynonymTable:
+    '''
+    synonyms of the terms of a dictionary, read from a memory mapped synonym table file (see write_synonym_table).
+    looking up the synonyms of a term reads its offsets and synonym term ids, without importing wordnet.
+
+    file_name -> name of the synonym table file.
+    dictionary -> dictionary the synonym table was written with, to get terms from their ids.
+    buffer -> memory mapped contents of the synonym table file.
+    size -> number of terms.
+    '''
+
+    def __init__(self, file_name, dictionary):
+        self.file_name = file_name
+        self.dictionary = dictionary
+        self._file = open(file_name, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(_synonyms_header)] != _synonyms_header:
+            self.close()
+            raise ValueError(f'unsupported synonym table format version: {file_name}')
+        self.size, _ = _counts.unpack_from(self.buffer, len(_synonyms_header))
+        self._offsets = len(_synonyms_header) + _counts.size
+        self._synonyms = self._offsets + 8 * (self.size + 1)
+        if isinstance(dictionary, Lexicon):
+            self._term_id, self._term = dictionary.term_id, dictionary.term
+        else:
+            ids = term_ids(dictionary)
+            self._term_id, self._term = lambda term: ids.get(term, -1), sorted(ids, key=ids.get).__getitem__
+
+    def get_synonyms(self, term):
+        '''
+        returns a set of synonyms of the given term, which are terms of the dictionary.
+        '''
+        term_id = self._term_id(term)
+        if term_id < 0:
+            return set()
+        start, end = struct.unpack_from('<2Q', self.buffer, self._offsets + 8 * term_id)
+        synonym_ids = struct.unpack_from(f'<{end - start}I', self.buffer, self._synonyms + 4 * start)
+        return {self._term(i) for i in synonym_ids}
+
+    def close(self):
+        '''
+        unmaps the buffer and closes the synonym table file.
+        '''
+        self.buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class SynonymTables:
+    '''
+    synonyms of the terms of several dictionaries, such as the segments of an index directory,
+    the synonyms of a term are the synonyms it has in any of the synonym tables.
+
+    tables -> list of synonym tables.
+    '''
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def get_synonyms(self, term):
+        '''
+        returns a set of synonyms of the given term, from every synonym table.
+        '''
+        synonyms = set()
+        for table in self.tables:
+            synonyms.update(table.get_synonyms(term))
+        return synonyms
+
+    def close(self):
+        '''
+        closes the synonym tables.
+        '''
+        for table in self.tables:
+            table.close()
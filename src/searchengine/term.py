@@ -8,13 +8,16 @@ class Term:
             this field is for temporary use, and is deleted after indexing to minimize
             storage space.
     offset -> the offset to the postings list of this term. 
+    max_score -> upper bound of tf(term frequency) / document length over the term's postings,
+                 used to skip documents that cannot reach the top k when ranking.
     '''
     
-    def __init__(self, doc_frequency=0, line=-1, offset=-1):
+    def __init__(self, doc_frequency=0, line=-1, offset=-1, max_score=0):
         self.doc_frequency = doc_frequency
         self.line = line
         self.offset = offset
+        self.max_score = max_score
 
     def __repr__(self):
-        return f' doc_frequency: {self.doc_frequency} offset: {self.offset}'
+        return f' doc_frequency: {self.doc_frequency} offset: {self.offset} max_score: {self.max_score}'
 
@@ -0,0 +1,60 @@
+import re
+
+nltk_tokenizer = 'nltk'
+regex_tokenizer = 'regex'
+tokenizers = [nltk_tokenizer, regex_tokenizer]
+
+class NltkTokenizer:
+    '''
+    tokenizes text with nltk.word_tokenize, which splits the text into sentences
+    and tokenizes each sentence with the treebank tokenizer.
+    nltk is only imported the first time text is tokenized, as it is slow to import.
+
+    name -> name of the tokenizer, recorded in the index metadata.
+    '''
+
+    name = nltk_tokenizer
+
+    def tokenize(self, text):
+        '''
+        splits text into a list of words and punctuation.
+        '''
+        from nltk import word_tokenize
+        return word_tokenize(text)
+
+class RegexTokenizer:
+    '''
+    tokenizes text with a single compiled regular expression, much faster than nltk.word_tokenize.
+    like the treebank tokenizer, every punctuation mark is a token of its own, and clitics are split
+    from their words (employer's -> employer 's, don't -> do n't), so the positions of words,
+    which phrase queries rely on, count the same tokens as nltk.word_tokenize for most text.
+    words may contain hyphens and periods (well-known, u.s), and numbers may contain commas (1,000).
+
+    name -> name of the tokenizer, recorded in the index metadata.
+    pattern -> compiled regular expression matching a single token.
+    '''
+
+    name = regex_tokenizer
+    pattern = re.compile(r'''
+        \w+(?=n't\b)                        # word before a n't clitic
+        | n't\b | '(?:s|m|d|ll|re|ve)\b     # clitics
+        | \w+(?:(?:[-.]|(?<=\d),(?=\d))\w+)* # words
+        | \.\.\. | -- | ``|''               # multi character punctuation
+        | [^\w\s]                           # any other punctuation
+        ''', re.IGNORECASE | re.VERBOSE)
+
+    def tokenize(self, text):
+        '''
+        splits text into a list of words and punctuation.
+        '''
+        return self.pattern.findall(text)
+
+def get_tokenizer(name):
+    '''
+    gets the tokenizer with the given name, one of tokenizers.
+    '''
+    if name == nltk_tokenizer:
+        return NltkTokenizer()
+    if name == regex_tokenizer:
+        return RegexTokenizer()
+    raise ValueError(f'unknown tokenizer: {name}')
@@ -1,15 +1,17 @@
+from collections import OrderedDict
 from datetime import datetime
 from math import log10
 from itertools import product
 from pickle import dump
 from pickle import load
-from nltk import PorterStemmer
-from nltk.corpus import wordnet
 
 from .document import Document
 from .term import Term
+from .tokenizer import nltk_tokenizer
+
+import json
+import os
 
-porter_stemmer = PorterStemmer()
 date_format = '%Y-%m-%d %H:%M:%S'
 
 def date_to_string(date):
@@ -42,11 +44,142 @@ def idf(n, d):
         return 0
     return log10(n / d)
 
+_porter_stemmer = None
+
+def get_porter_stemmer():
+    '''
+    gets the porter stemmer, nltk is only imported the first time a word is stemmed, as it is slow to import.
+    '''
+    global _porter_stemmer
+    if _porter_stemmer is None:
+        from nltk import PorterStemmer
+        _porter_stemmer = PorterStemmer()
+    return _porter_stemmer
+
+class StemCache:
+    '''
+    bounded cache of word -> stemmed term, which evicts the least recently used word when it is full.
+    legal text repeats the same words often, so most words only have to be stemmed once.
+
+    size -> maximum number of words kept in the cache, 0 disables the cache.
+    hits -> number of words found in the cache.
+    misses -> number of words that had to be stemmed.
+    stems -> dictionary of word -> stemmed term, from least to most recently used.
+    '''
+
+    def __init__(self, size=1 << 20):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.stems = OrderedDict()
+
+    def stem(self, word):
+        '''
+        strips whitespace and casefolds the word before stemming it.
+        '''
+        try:
+            term = self.stems[word]
+            self.stems.move_to_end(word)
+            self.hits += 1
+            return term
+        except KeyError:
+            # not cached, or evicted by another thread in between.
+            pass
+        self.misses += 1
+        term = get_porter_stemmer().stem(word.strip().casefold())
+        if self.size > 0:
+            self.stems[word] = term
+            if len(self.stems) > self.size:
+                self.stems.popitem(last=False)
+        return term
+
+    def save(self, file_to_write):
+        '''
+        serializes the cached words and their stemmed terms to the file_to_write using the pickle library.
+        '''
+        with open(file_to_write, 'wb') as f:
+            dump(list(self.stems.items()), f)
+
+    def load(self, file_to_load):
+        '''
+        adds the words and stemmed terms stored in the file_to_load to the cache,
+        so words stemmed before do not have to be stemmed again.
+        '''
+        with open(file_to_load, 'rb') as f:
+            self.update(load(f))
+
+    def update(self, stems):
+        '''
+        adds the list of (word, stemmed term) pairs to the cache as the most recently used words,
+        such as the words stemmed by another process.
+        '''
+        for word, term in stems[-self.size:] if self.size > 0 else []:
+            self.stems[word] = term
+            self.stems.move_to_end(word)
+        while len(self.stems) > self.size:
+            self.stems.popitem(last=False)
+
+    def clear(self):
+        '''
+        removes all words from the cache and resets the hit and miss counts.
+        '''
+        self.stems.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f'size: {len(self.stems)}/{self.size}, hits: {self.hits}, misses: {self.misses}'
+
+stem_cache = StemCache()
+
 def stem(word):
     '''
     strips whitespace and casefolds the word before stemming it.
+    stemmed terms are cached in stem_cache, which is shared by indexing and query parsing.
+    '''
+    return stem_cache.stem(word)
+
+def stems_file_name(dictionary_file):
+    '''
+    gets the name of the file to persist the stem cache to, next to the dictionary file.
+    '''
+    return f'{dictionary_file}.stems'
+
+def load_stem_cache(dictionary_file):
+    '''
+    warms stem_cache with the stems persisted next to the dictionary file when it was indexed, if any.
     '''
-    return porter_stemmer.stem(word.strip().casefold())
+    file_name = stems_file_name(dictionary_file)
+    if os.path.exists(file_name):
+        stem_cache.load(file_name)
+
+def metadata_file_name(dictionary_file):
+    '''
+    gets the name of the file to store the index metadata in, next to the dictionary file.
+    '''
+    return f'{dictionary_file}.meta'
+
+def write_metadata(metadata, file_to_write):
+    '''
+    writes the dictionary of index metadata to the file_to_write as json.
+    metadata:
+    tokenizer -> name of the tokenizer the documents were tokenized with, queries are tokenized with the same tokenizer.
+    impacts -> number of terms, segments and postings of the impact ordered postings (see write_impacts),
+               only recorded if the index has them.
+    '''
+    with open(file_to_write, 'w', encoding='utf8') as f:
+        json.dump(metadata, f)
+
+def load_metadata(file_to_load):
+    '''
+    loads the dictionary of index metadata from the file_to_load.
+    indexes built before metadata was recorded have no metadata file, and were tokenized with nltk.
+    '''
+    metadata = {'tokenizer': nltk_tokenizer}
+    if os.path.exists(file_to_load):
+        with open(file_to_load, 'r', encoding='utf8') as f:
+            metadata.update(json.load(f))
+    return metadata
 
 def has_any_alphanumeric(word):
     '''
@@ -73,6 +206,44 @@ def inverse_accumulate(numbers):
         total += delta
     return output
 
+def vbyte_encode(numbers):
+    '''
+    encodes a list of non-negative integers with variable byte encoding.
+    each byte holds 7 bits of a number, least significant bits first.
+    the high bit of a byte is set if more bytes of the same number follow.
+    [5, 300] -> [0x05, 0xac, 0x02]
+    '''
+    output = bytearray()
+    for n in numbers:
+        if n < 0:
+            raise ValueError(f'cannot encode negative number: {n}')
+        while n >= 0x80:
+            output.append((n & 0x7f) | 0x80)
+            n >>= 7
+        output.append(n)
+    return bytes(output)
+
+def vbyte_decode(buffer, offset, count):
+    '''
+    decodes count variable byte encoded integers from buffer, starting at offset.
+    returns the decoded list of integers and the offset right after the last byte read.
+
+    vbyte_decode(vbyte_encode(x), 0, len(x)) -> (x, len(vbyte_encode(x)))
+    '''
+    output = []
+    for _ in range(count):
+        n = 0
+        shift = 0
+        byte = buffer[offset]
+        while byte & 0x80:
+            n |= (byte & 0x7f) << shift
+            shift += 7
+            offset += 1
+            byte = buffer[offset]
+        output.append(n | (byte << shift))
+        offset += 1
+    return output, offset
+
 def read_line_from_file(file_name, ptr):
     '''
     reads a line from a file given a ptr (offset).
@@ -148,62 +319,46 @@ def _interleave_max(iterables):
                     status[i] = 0
                 continue
 
-def union(l1, l2):
-    '''
-    returns a list containing all elements from l1 and l2.
-    l1 and l2 must be sorted before calling this function.
-    '''
-    output = []
-    iter1, iter2 = iter(l1), iter(l2)
-    try:
-        n1, n2 = next(iter1), next(iter2)
-        while 1:
-            if n1 < n2:
-                n1 = next(iter1)
-            elif n1 > n2:
-                n2 = next(iter2)
-            else:
-                output.append(n2)
-                n1, n2 = next(iter1), next(iter2)
-    except StopIteration:
-        return output
-    return output
-
-def within_proximity(l1, l2, distance):
-    '''
-    checks if there are any elements in l1 and l2, i and j,
-    where difference between |i - j| = distance.
-    '''
-    shifted_l1 = [(i + distance) for i in l1]
-    match = union(shifted_l1, l2)
-    return match
-
 def write_dictionary(dictionary, file_to_write):
     '''
-    serializes dictionary to the file_to_write using the pickle library.
+    writes dictionary to the file_to_write as a lexicon, see lexicon.write_lexicon.
     '''
-    with open(file_to_write, 'wb') as f:
-        dump(dictionary, f)
+    from .lexicon import write_lexicon # imported here, as lexicon depends on util.
+    write_lexicon(dictionary, file_to_write)
 
-def write_documents(documents, file_to_write):
+def write_documents(documents, file_to_write, dictionary):
     '''
-    serializes documents to the file_to_write using the pickle library.
+    writes documents to the file_to_write as a document store, with vector terms numbered by their ids
+    in the lexicon of dictionary, see documentstore.write_document_store.
     '''
-    with open(file_to_write, 'wb') as f:
-        dump(documents, f)
+    from .documentstore import write_document_store # imported here, as documentstore depends on util.
+    write_document_store(documents, dictionary, file_to_write)
 
 def load_dictionary(file_to_load):
     '''
     loads the dictionary stored in the file_to_load.
+    lexicon files are memory mapped and looked up without loading them, see lexicon.Lexicon.
+    dictionaries written before lexicons were added are unpickled.
     '''
+    from .lexicon import Lexicon # imported here, as lexicon depends on util.
+    from .lexicon import is_lexicon_file
+    if is_lexicon_file(file_to_load):
+        return Lexicon(file_to_load)
     with open(file_to_load, 'rb') as f:
         dictionary = load(f)
     return dictionary
 
-def load_documents(file_to_load):
+def load_documents(file_to_load, dictionary=None):
     '''
     loads the documents stored in the file_to_load.
-    '''
+    document stores are memory mapped and read column by column, see documentstore.DocumentStore,
+    the dictionary they were written with is needed to read the terms of document vectors.
+    documents written before document stores were added are unpickled.
+    '''
+    from .documentstore import DocumentStore # imported here, as documentstore depends on util.
+    from .documentstore import is_document_store_file
+    if is_document_store_file(file_to_load):
+        return DocumentStore(file_to_load, dictionary)
     with open(file_to_load, 'rb') as f:
         documents = load(f)
     return documents
@@ -212,6 +367,7 @@ def get_synonyms(word):
     '''
     returns a set of synonyms of the given word, generated from wordnet.
     '''
+    from nltk.corpus import wordnet
     synonyms = set()
     for synset in wordnet.synsets(word):
         for lemma in synset.lemma_names():
@@ -1,15 +1,31 @@
 from functools import reduce
-from heapq import heapify
-from heapq import heappop
 from heapq import heappush
+from heapq import heapreplace
+from heapq import nsmallest
 from math import sqrt
 from .postingslist import PostingsList
-from .util import read_line_from_file
+from .postingslist import PostingsCursor
+from .documentstore import get_lengths
+from .documentstore import get_many
+from .documentstore import sum_normalized_vectors
+from .numpyscorer import NumpyScorer
 from .util import tf
 from .util import idf
 from .util import stem
 from .util import get_synonyms
 
+import time
+
+python_engine = 'python'
+numpy_engine = 'numpy'
+engines = (python_engine, numpy_engine)
+
+# relevance feedback adds the top terms of up to 10 document vectors to a query vector.
+default_max_query_terms = 64
+
+# relative tolerance on score upper bounds, so rounding errors never prune a document that could reach the top k.
+_bound_tolerance = 1e-9
+
 class VectorSpaceModel:
     '''
     vector space model.
@@ -21,24 +37,45 @@ class VectorSpaceModel:
 
     dictionary -> dictionary of term -> term objects
     documents -> dictionary of doc_id -> doc objects
-    postings_file -> file containing postings lists
+    lengths -> mapping of doc_id -> document length, the only column of documents needed for ranking.
+               the lengths of the documents scored by a query are looked up together, see get_many.
+    postings_file -> postings file object to read postings lists from
+    engine -> python_engine ranks documents with python dictionaries,
+              numpy_engine ranks documents with a NumpyScorer (requires numpy).
+    synonyms -> synonym table to expand queries with, see SynonymTable.
+                None looks the synonyms of query terms up in wordnet, for indexes built without a synonym table.
+    max_query_terms -> largest number of terms kept in a query vector after relevance feedback, None keeps every term.
+    impacts -> impact ordered postings of the index to rank by impact with, see ImpactFile, or None.
+    postings_budget -> number of postings to score when ranking by impact, None does not limit them.
+    time_budget -> number of seconds to score postings for when ranking by impact, None does not limit it.
+                   documents are ranked by impact when impacts are given and either budget is set.
     '''
 
-    def __init__(self, dictionary, documents, postings_file):
+    def __init__(self, dictionary, documents, postings_file, engine=python_engine, synonyms=None,
+                 max_query_terms=default_max_query_terms, impacts=None, postings_budget=None, time_budget=None):
+        if engine not in engines:
+            raise ValueError(f'unknown engine: {engine}')
         self.dictionary = dictionary
         self.documents = documents
+        self.lengths = get_lengths(documents)
         self.postings_file = postings_file
+        self.engine = engine
+        self.synonyms = synonyms
+        self.max_query_terms = max_query_terms
+        self.impacts = impacts
+        self.postings_budget = postings_budget
+        self.time_budget = time_budget
+        self.scorer = NumpyScorer(dictionary, documents, postings_file) if engine == numpy_engine else None
 
     def _get_postings_list(self, term):
         '''
         gets the term's postings list.
         returns an empty postings list if term is not in dictionary.
         '''
-        if term not in self.dictionary:
+        entry = self.dictionary.get(term)
+        if entry is None:
             return PostingsList()
-        offset = self.dictionary[term].offset
-        line = read_line_from_file(self.postings_file, offset)
-        return PostingsList.parse(line).decompress()
+        return self.postings_file.read(entry.offset)
 
     def _build_query_vector(self, terms):
         '''
@@ -46,29 +83,25 @@ class VectorSpaceModel:
         weights of the vector are derived from tf_idf weighting.
         '''
         vector = {}
-        existing_terms = [t for t in terms if t in self.dictionary]
+        entries = {t: self.dictionary.get(t) for t in set(terms)} # each term is looked up once.
+        existing_terms = [t for t in terms if entries[t] is not None]
         for t in existing_terms:
             if t not in vector:
                 vector[t] = 0
             vector[t] += 1
         for t, f in vector.items():
-            tf_idf = tf(f) * idf(len(self.documents), self.dictionary[t].doc_frequency)
+            tf_idf = tf(f) * idf(len(self.documents), entries[t].doc_frequency)
             vector[t] = tf_idf if tf_idf >= 0 else 0
         return vector
 
     def _build_centroid_vector(self, doc_ids):
         '''
         returns a centroid of a list of vectors mapped from doc ids.
+        the normalized vectors are summed from the vector columns of the documents, see sum_normalized_vectors.
         '''
-        vectors = [self.documents[d].get_normalized_vector() for d in doc_ids if d in self.documents]
-        centroid_vector = {}
-        for vector in vectors:
-            for t, w in vector.items():
-                if t not in centroid_vector:
-                    centroid_vector[t] = 0
-                centroid_vector[t] += w
+        centroid_vector, count = sum_normalized_vectors(self.documents, doc_ids)
         for t, w in centroid_vector.items():
-            centroid_vector[t] = w / len(vectors)
+            centroid_vector[t] = w / count
         return centroid_vector
 
     def _adjust_vector(self, query_vector, centroid, query_coefficient, centroid_coefficient):
@@ -76,17 +109,23 @@ class VectorSpaceModel:
         returns an adjusted vector calculated from a query vector and a centroid.
         query_coefficient and centroid_coefficient dictates which vector has a stronger influence
         on the resultant vector.
+        the vector is truncated to the max_query_terms terms with the largest weights.
         '''
-        vector = {}
-        for t, w in query_vector.items():
-            if t not in vector:
-                vector[t] = 0
-            vector[t] += query_coefficient * w
+        vector = {t: query_coefficient * w for t, w in query_vector.items()}
         for t, w in centroid.items():
-            if t not in vector:
-                vector[t] = 0
-            vector[t] += centroid_coefficient * w
-        return vector
+            vector[t] = vector.get(t, 0) + centroid_coefficient * w
+        return self._truncate_vector(vector)
+
+    def _truncate_vector(self, vector):
+        '''
+        drops the terms with the smallest weights from the vector, so it has at most max_query_terms terms.
+        terms with the same weight are kept in increasing term order.
+        every term left in the query vector is a postings list read when ranking.
+        '''
+        if self.max_query_terms is None or len(vector) <= self.max_query_terms:
+            return vector
+        kept = set(nsmallest(self.max_query_terms, vector, key=lambda t: (-vector[t], t)))
+        return {t: w for t, w in vector.items() if t in kept}
 
     def _apply_relevance_feedback(self, query_vector, relevant_doc_ids):
         '''
@@ -115,7 +154,7 @@ class VectorSpaceModel:
         '''
         expanded_terms = {}
         for term in query_vector:
-            synonyms = get_synonyms(term)
+            synonyms = get_synonyms(term) if self.synonyms is None else self.synonyms.get_synonyms(term)
             for s in synonyms:
                 if s not in expanded_terms:
                     expanded_terms[s] = []
@@ -126,10 +165,12 @@ class VectorSpaceModel:
             query_vector[synonym] = average_weight
         return query_vector
 
-    def get_ranking(self, terms, relevant_doc_ids):
+    def get_ranking(self, terms, relevant_doc_ids, k=None, candidates=None):
         '''
         returns a ranked list of document ids from the a free text query, given relevant doc ids
         from relevance judgements.
+        if k is given, only the top k document ids are returned.
+        if candidates are given, only the candidate doc ids are ranked, see _rank_candidates.
 
         the query vector is refined with relevance feedback, apply Rocchio (1971) algorithm.
         no query expansion and no pseudo relevance feedback so applied to the vector.
@@ -137,10 +178,47 @@ class VectorSpaceModel:
         query_vector = self._build_query_vector(terms)
         if relevant_doc_ids:
             query_vector = self._apply_relevance_feedback(query_vector, relevant_doc_ids)
-        result = self._rank(query_vector, relevant_doc_ids)
+        if candidates is not None and self.scorer is None and not self._can_rank_by_impact(query_vector):
+            return self._rank_candidates(query_vector, relevant_doc_ids, candidates)[:k]
+        result = self._rank(query_vector, relevant_doc_ids, k)
         return result
 
-    def retrieve(self, terms, relevant_doc_ids):
+    def _rank_candidates(self, query_vector, relevant_doc_ids, candidates):
+        '''
+        ranks the candidate doc ids with the given query vector using cosine scoring, the same as _rank
+        ranks them among all documents, without scoring the documents that are not candidates.
+        the cursor over each term's postings list skips to the candidates in increasing doc_id order,
+        so the blocks of binary postings lists without candidates are not decoded.
+        candidates that contain none of the query terms are not ranked, like documents _rank does not score.
+        relevant doc ids are ranked at the top regardless of score.
+        '''
+        relevant_doc_set = set(relevant_doc_ids)
+        doc_ids = sorted(d for d in candidates if d not in relevant_doc_set)
+        scores = {}
+        for term, query_weight in query_vector.items():
+            if not doc_ids:
+                break
+            entry = self.dictionary.get(term)
+            if entry is None:
+                continue
+            cursor = self.postings_file.cursor(entry.offset)
+            for doc_id in doc_ids:
+                cursor.next_geq(doc_id)
+                if cursor.doc_id() is None:
+                    break
+                while cursor.doc_id() == doc_id: # a document with several rows has a posting for each row.
+                    if doc_id not in scores:
+                        scores[doc_id] = 0
+                    scores[doc_id] += tf(cursor.posting().term_frequency) * query_weight
+                    cursor.next()
+
+        output = [doc_id for doc_id in relevant_doc_ids]
+        lengths = get_many(self.lengths, scores)
+        output.extend([doc_id for score, doc_id in sorted((-score / lengths[doc_id], doc_id)
+                                                          for doc_id, score in scores.items())])
+        return output
+
+    def retrieve(self, terms, relevant_doc_ids, k=None):
         '''
         retrieves a ranked list of document ids from searching the given free text terms,
         given relevant doc ids from relevance judgements.
@@ -152,6 +230,8 @@ class VectorSpaceModel:
         the initial ranking are assumed as relevant and used for pseudo relevance feedback.
 
         then another ranking is done on the query vector and returned.
+        if k is given, only the top k document ids are returned.
+        the initial ranking only needs the top 10 documents when it is followed by pseudo relevance feedback.
         '''        
         query_vector = self._build_query_vector(terms)
 
@@ -163,19 +243,32 @@ class VectorSpaceModel:
         relevant_feedback_total_size = 10
         relevant_size = len(relevant_doc_ids)
         assumed_relevant_size = max(0, relevant_feedback_total_size - relevant_size)
-        result = self._rank(query_vector, relevant_doc_ids)
+        initial_k = relevant_size + assumed_relevant_size if assumed_relevant_size else k
+        result = self._rank(query_vector, relevant_doc_ids, initial_k)
         assumed_relevant_doc_ids = result[relevant_size:relevant_size+assumed_relevant_size]
         if assumed_relevant_doc_ids:
             query_vector = self._apply_relevance_feedback(query_vector, assumed_relevant_doc_ids)
-            result = self._rank(query_vector, relevant_doc_ids)
+            result = self._rank(query_vector, relevant_doc_ids, k)
 
-        return result
+        return result[:k] # the initial ranking has up to 10 documents, which may be more than k.
 
-    def _rank(self, query_vector, relevant_doc_ids):
+    def _rank(self, query_vector, relevant_doc_ids, k=None):
         '''
         ranks doc ids with the given query vector using cosine scoring.
         relevant doc ids are ranked at the top regardless of score.
+        documents with the same score are ranked in increasing doc id order.
+        if k is given, only the top k doc ids are returned, and documents that cannot reach the
+        top k are skipped when the dictionary has max scores for the query terms.
+        with the numpy engine, documents are ranked by the numpy scorer instead.
+        with a postings or time budget, documents are ranked by impact instead, see _rank_by_impact.
         '''
+        if self._can_rank_by_impact(query_vector):
+            return self._rank_by_impact(query_vector, relevant_doc_ids, k)
+        if self.scorer is not None:
+            return self.scorer.rank(query_vector, relevant_doc_ids, k)
+        if k is not None and self._can_prune(query_vector):
+            return self._rank_top_k(query_vector, relevant_doc_ids, k)
+
         scores = {}
         for term, query_weight in query_vector.items():
             postings_list = self._get_postings_list(term)
@@ -186,90 +279,150 @@ class VectorSpaceModel:
                     scores[doc_id] = 0
                 scores[doc_id] += doc_weight * query_weight
         
+        lengths = get_many(self.lengths, scores)
         for doc_id, score in scores.items():
-            scores[doc_id] = score / self.documents[doc_id].length
+            scores[doc_id] = score / lengths[doc_id]
 
-        score_objs = [Score(doc_id, score) for doc_id, score in scores.items()]
-        max_score_heap = MaxScoreHeap(score_objs)
-
-        output = [doc_id for doc_id in relevant_doc_ids]
+        output = [doc_id for doc_id in relevant_doc_ids][:k]
         top_results = set(relevant_doc_ids)
-        while len(max_score_heap):
-            next_score = max_score_heap.pop()
-            if next_score.doc_id not in top_results:
-                output.append(next_score.doc_id)
+        candidates = ((-score, doc_id) for doc_id, score in scores.items() if doc_id not in top_results)
+        if k is None:
+            ranked = sorted(candidates)
+        else:
+            ranked = nsmallest(max(0, k - len(output)), candidates) # bounded heap of the best candidates.
+        output.extend([doc_id for score, doc_id in ranked])
 
         return output
 
-class Score:
-    '''
-    represents a doc_id and score pairing.
-    ordering is defined to facilitate MaxScoreHeap operations.
-    '''
-
-    def __init__(self, doc_id, score):
-        self.doc_id = doc_id
-        self.score = score
-
-    def __repr__(self):
-        return f'{self.doc_id} : {self.score}'
-
-    def __eq__(self, o):
-        return type(o) == Score and self.score == o.score
-
-    def __ne__(self, o):
-        return type(o) == Score and self.score != o.score
-
-    def __lt__(self, o):
-        return type(o) == Score and self.score < o.score
-
-    def __le__(self, o):
-        return type(o) == Score and self.score <= o.score
-
-    def __gt__(self, o):
-        return type(o) == Score and self.score > o.score
-
-    def __ge__(self, o):
-        return type(o) == Score and self.score >= o.score
-
-class MaxScoreHeap:
-    '''
-    max heap for score objects
-    uses heapq to facilitate most of the logic.
-    since heapq is a min heap, scores are negated before being added or
-    removed from the max heap to simulate max heap behaviour from heapq.
-    '''
-
-    def __init__(self, scores):
+    def _can_rank_by_impact(self, query_vector):
         '''
-        scores is an array to be transformed into a max heap.
+        checks if the query vector is ranked by impact: the index needs impact ordered postings,
+        a postings or time budget must be set and query weights must not be negative.
         '''
-        self.scores = [self._negate_score(score) for score in scores]
-        heapify(self.scores)
+        if self.impacts is None or (self.postings_budget is None and self.time_budget is None):
+            return False
+        return all(query_weight >= 0 for query_weight in query_vector.values())
 
-    def _negate_score(self, score):
+    def _rank_by_impact(self, query_vector, relevant_doc_ids, k=None):
         '''
-        negates the score, so that numerically, the behaviour of the
-        heapq simulates a max heap.
+        ranks doc ids with the given query vector score at a time (Anh and Moffat, 2006), from impact ordered postings.
+        the impact segments of all query terms are scored in decreasing order of query weight * largest impact,
+        so the postings that add the most to the scores are scored first, and scoring stops once the postings budget
+        or time budget is spent. the ranking is approximate: documents are ranked by the part of their score summed
+        before scoring stopped. without a budget, the ranking is the same as _rank, within float rounding.
         '''
-        score.score = -score.score
-        return score
+        segments = []
+        for term, query_weight in query_vector.items():
+            for bound, segment in self.impacts.get_segments(term):
+                segments.append((-query_weight * bound, segment, query_weight))
+        segments.sort()
 
-    def pop(self):
-        '''
-        returns the largest score in the max heap.
-        '''
-        return self._negate_score(heappop(self.scores))
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        budget = self.postings_budget
+        scores = {}
+        for _, segment, query_weight in segments:
+            if (budget is not None and budget <= 0) or (deadline is not None and time.perf_counter() > deadline):
+                break
+            doc_ids, impacts = self.impacts.read_segment(segment)
+            for doc_id, impact in zip(doc_ids, impacts):
+                scores[doc_id] = scores.get(doc_id, 0) + query_weight * impact
+            if budget is not None:
+                budget -= len(doc_ids)
+
+        output = [doc_id for doc_id in relevant_doc_ids][:k]
+        top_results = set(relevant_doc_ids)
+        candidates = ((-score, doc_id) for doc_id, score in scores.items() if doc_id not in top_results)
+        if k is None:
+            ranked = sorted(candidates)
+        else:
+            ranked = nsmallest(max(0, k - len(output)), candidates)
+        output.extend([doc_id for score, doc_id in ranked])
+        return output
 
-    def push(self, score):
+    def _can_prune(self, query_vector):
         '''
-        adds the score to the max heap.
+        checks if the top k documents of the query vector can be ranked with pruning.
+        every query term in the dictionary needs a max_score (dictionaries built by
+        older indexers do not have one) and query weights must not be negative.
         '''
-        heappush(self._negate_score(score))
-
-    def __len__(self):
+        for term, query_weight in query_vector.items():
+            if query_weight < 0:
+                return False
+            entry = self.dictionary.get(term)
+            if entry is not None and not hasattr(entry, 'max_score'):
+                return False
+        return True
+
+    def _rank_top_k(self, query_vector, relevant_doc_ids, k):
         '''
-        returns the number of scores in the max heap.
+        ranks the top k doc ids with the given query vector, skipping documents with
+        WAND (Broder et al., 2003) pruning.
+        the score a term can add to a document is bounded by its query weight * max_score.
+        cursors over the postings lists are sorted by doc_id, and the pivot is the first doc_id where
+        the bounds of the cursors up to it could beat the kth best score so far.
+        cursors behind the pivot skip to it, since documents before it cannot reach the top k.
+        scores are summed in the same order as _rank, so the ranking is the same as the first k of _rank.
         '''
-        return len(self.scores)
+        output = [doc_id for doc_id in relevant_doc_ids][:k]
+        size = k - len(output)
+        if size <= 0:
+            return output
+
+        cursors = []
+        for term, query_weight in query_vector.items():
+            entry = self.dictionary.get(term)
+            if entry is None:
+                continue
+            postings_list = self.postings_file.read(entry.offset)
+            if len(postings_list):
+                cursors.append(ScoreCursor(postings_list, query_weight, query_weight * entry.max_score))
+
+        top_results = set(relevant_doc_ids)
+        top_scores = [] # min heap of (score, -doc_id), the root is the kth best document so far.
+        active_cursors = [c for c in cursors]
+        while active_cursors:
+            active_cursors.sort(key=lambda c: c.doc_id())
+            threshold = top_scores[0][0] if len(top_scores) == size else None
+            pivot = None
+            bound = 0
+            for i, cursor in enumerate(active_cursors):
+                bound += cursor.upper_bound
+                if threshold is None or bound * (1 + _bound_tolerance) >= threshold:
+                    pivot = i
+                    break
+            if pivot is None:
+                break
+
+            pivot_doc_id = active_cursors[pivot].doc_id()
+            if active_cursors[0].doc_id() == pivot_doc_id:
+                score = 0
+                for cursor in cursors:
+                    while cursor.doc_id() == pivot_doc_id:
+                        score += tf(cursor.posting().term_frequency) * cursor.query_weight
+                        cursor.next()
+                if pivot_doc_id not in top_results:
+                    entry = (score / self.lengths[pivot_doc_id], -pivot_doc_id)
+                    if len(top_scores) < size:
+                        heappush(top_scores, entry)
+                    elif entry > top_scores[0]:
+                        heapreplace(top_scores, entry)
+            else:
+                for cursor in active_cursors[:pivot]:
+                    cursor.next_geq(pivot_doc_id)
+            active_cursors = [c for c in active_cursors if c.doc_id() is not None]
+
+        output.extend([-doc_id for score, doc_id in sorted(top_scores, reverse=True)])
+        return output
+
+class ScoreCursor(PostingsCursor):
+    '''
+    postings cursor of a query term, used for top k ranking.
+
+    query_weight -> weight of the term in the query vector.
+    upper_bound -> largest score the term can add to a document.
+    '''
 
+    def __init__(self, postings_list, query_weight, upper_bound):
+        super().__init__(postings_list)
+        self.query_weight = query_weight
+        self.upper_bound = upper_bound
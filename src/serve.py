@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+from searchengine import ResultCache
+from searchengine import SearchEngine
+from searchengine import SearchServer
+from searchengine import default_cache_bytes
+from searchengine import engines
+from searchengine import load_dictionary
+from searchengine import load_documents
+from searchengine import load_stem_cache
+from searchengine import load_synonym_table
+from searchengine import load_metadata
+from searchengine import metadata_file_name
+
+import getopt
+import os
+import sys
+
+usage = f'usage: {sys.argv[0]} (-x index-directory | -d dictionary-file -p postings-file) [-a address] [-n port] [-e engine] [-c cache-megabytes] [-r result-cache-size] [-l result-lifetime] [-s result-cache-file]'
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'd:p:x:a:n:e:c:r:l:s:')
+except getopt.GetoptError:
+    print(usage)
+    sys.exit(2)
+
+dictionary_file = None
+postings_file = None
+index_directory = None
+address = 'localhost'
+port = 8000
+engine = 'python'
+cache_bytes = default_cache_bytes
+result_cache_size = 1024
+result_lifetime = None
+result_cache_file = None
+
+for x, y in opts:
+    if x == '-d':
+        dictionary_file = y
+    elif x == '-p':
+        postings_file = y
+    elif x == '-x':
+        index_directory = y
+    elif x == '-a':
+        address = y
+    elif x == '-n':
+        port = int(y)
+    elif x == '-e':
+        engine = y
+    elif x == '-c':
+        cache_bytes = int(y) * 1024 * 1024
+    elif x == '-r':
+        result_cache_size = int(y)
+    elif x == '-l':
+        result_lifetime = float(y)
+    elif x == '-s':
+        result_cache_file = y
+    else:
+        raise AssertionError('unhandled option')
+
+if (index_directory == None and (dictionary_file == None or postings_file == None)) or engine not in engines:
+    print(usage)
+    sys.exit(2)
+
+if index_directory != None:
+    search_engine = SearchEngine.open(index_directory, cache_bytes, engine)
+else:
+    document_file = 'document.txt'
+    dictionary = load_dictionary(dictionary_file)
+    documents = load_documents(document_file, dictionary)
+    load_stem_cache(dictionary_file)
+    metadata = load_metadata(metadata_file_name(dictionary_file))
+    synonyms = load_synonym_table(dictionary_file, dictionary)
+    search_engine = SearchEngine(dictionary, documents, postings_file, cache_bytes, engine, metadata['tokenizer'], synonyms)
+
+search_engine.result_cache = ResultCache(result_cache_size, result_lifetime)
+if result_cache_file != None and os.path.exists(result_cache_file):
+    search_engine.result_cache.load(result_cache_file)
+
+with SearchServer(search_engine, (address, port)) as server:
+    print(f'serving {len(search_engine.documents)} documents on http://{address}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if result_cache_file != None:
+            server.search_engine.result_cache.save(result_cache_file)
+        server.search_engine.close() # the search engine is replaced when the index directory is reloaded.